@@ -0,0 +1,355 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Headless benchmarks for map generation, rendering and simulation.
+
+Run all the benchmarks and write the results to a JSON file:
+
+    python bench.py -o results.json
+
+Compare a run against a stored baseline, exiting with a non-zero status
+if any benchmark got slower by more than the threshold:
+
+    python bench.py --compare baseline.json --threshold 0.1
+
+"""
+
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Benchmarks must run without a window, so use SDL's dummy video driver
+# unless told otherwise.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy
+import pygame
+
+import township.actors
+import township.constructions
+import township.images
+import township.population
+import township.simulation
+import township.ui
+from township import conf
+from township.map import Chunk, Map, make_generators
+from township.util import vectors
+
+
+VIEWPORT_SIZE = (1920, 1080)
+MINIMAP_SIZE = (256, 256)
+
+BENCHMARKS = []
+
+
+def benchmark(name, **kwargs):
+    """Register a benchmark function under the given name.
+
+    The function is called with a `Timer` as the first argument and any
+    keyword arguments given here. It should time `timer.repeat` runs of
+    the code being measured, using the timer as a context manager around
+    each run.
+
+    """
+    def decorator(func):
+        BENCHMARKS.append((name, func, kwargs))
+        return func
+    return decorator
+
+
+class Timer(object):
+
+    """Record the durations of the runs of a benchmark."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.times = []
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.times.append(time.perf_counter() - self._start)
+
+    def summary(self):
+        times = sorted(self.times)
+        return {
+            'runs': len(times),
+            'min': times[0],
+            'median': times[len(times) // 2],
+            'mean': sum(times) / len(times)
+        }
+
+
+@benchmark('noise2d', calls=10000)
+def bench_noise2d(timer, calls):
+    height_gen = make_generators(conf.SEED)[0]
+    for _ in range(timer.repeat):
+        with timer:
+            for i in range(calls):
+                height_gen.noise2d(i, i * 7, octaves=5)
+
+
+@benchmark('chunk_construct')
+def bench_chunk_construct(timer):
+    generators = make_generators(conf.SEED)
+    for i in range(timer.repeat):
+        with timer:
+            Chunk(i, -i, *generators)
+
+
+@benchmark('chunk_render')
+def bench_chunk_render(timer):
+    chunk = Chunk(0, 0, *make_generators(conf.SEED))
+    for _ in range(timer.repeat):
+        with timer:
+            chunk.render()
+
+
+@benchmark('map_pan', frames=60, speed=16)
+def bench_map_pan(timer, frames, speed):
+    surface = pygame.Surface(VIEWPORT_SIZE)
+    minimap = pygame.Surface(MINIMAP_SIZE)
+    for _ in range(timer.repeat):
+        game_map = Map(conf.SEED, generate=False)
+        with timer:
+            for frame in range(frames):
+                xoffset = -frame * speed
+                yoffset = -frame * speed // 2
+                game_map.update(surface, xoffset, yoffset)
+                game_map.draw(surface, xoffset, yoffset, minimap)
+
+
+@benchmark('viewport_draw', frames=60)
+def bench_viewport_draw(timer, frames):
+    # Drawing only, with every chunk in view already rendered and some
+    # stockpiles and a selection to draw.
+    surface = pygame.Surface(VIEWPORT_SIZE).convert()
+    game_map = Map(conf.SEED, generate=False)
+    game_map.update(surface, 0, 0)
+    game_map.place(township.constructions.Stockpile(
+        [game_map.get_tile(x * 16, y * 16)
+         for x in range(8, 40) for y in range(8, 24)]))
+    for x in range(48, 80):
+        game_map.get_tile(x * 16, 160).select()
+    for chunk in game_map.render_set:
+        chunk.dirty = False
+        chunk.render()
+    for _ in range(timer.repeat):
+        with timer:
+            for frame in range(frames):
+                game_map.draw(surface, 0, 0)
+
+
+@benchmark('select_to_tile', steps=32)
+def bench_select_to_tile(timer, steps):
+    game_map = Map(conf.SEED, x=4, y=4)
+    # Skip GameController.__init__, which loads the save directory and
+    # registers a save to be written when the process exits.
+    controller = township.ui.GameController.__new__(
+        township.ui.GameController)
+    controller.map = game_map
+    for _ in range(timer.repeat):
+        controller.state = 'idle'
+        controller.selected = []
+        controller.selected_items = []
+        controller.selected_actors = pygame.sprite.Group()
+        with timer:
+            controller.select_tile(0, 0)
+            for step in range(1, steps + 1):
+                controller.select_to_tile(step * 16, step * 8)
+        controller.clear_selection()
+
+
+def _bench_villagers(timer, count, ticks=10):
+    actors = pygame.sprite.Group()
+    for i in range(count):
+        villager = township.actors.Villager()
+        villager.move_to(500 + i % 1000, 2000 + i % 700)
+        actors.add(villager)
+    for _ in range(timer.repeat):
+        with timer:
+            for _ in range(ticks):
+                actors.update(0, 0)
+
+
+benchmark('villagers_1', count=1)(_bench_villagers)
+benchmark('villagers_100', count=100)(_bench_villagers)
+benchmark('villagers_10000', count=10000)(_bench_villagers)
+
+
+@benchmark('population_adjust', count=10000, pairs=10000)
+def bench_population_adjust(timer, count, pairs):
+    # One tick's worth of affinity changes between random villagers, in a
+    # population which already has 20 relationships per villager.
+    rng = numpy.random.RandomState(0)
+    population = township.population.Population()
+    for i in range(count):
+        population.add(township.actors.Villager())
+    population.adjust(rng.randint(0, count, 20 * count),
+                      rng.randint(0, count, 20 * count),
+                      rng.uniform(-1, 1, 20 * count))
+    for _ in range(timer.repeat):
+        sources = rng.randint(0, count, pairs)
+        targets = rng.randint(0, count, pairs)
+        with timer:
+            population.adjust(sources, targets, 0.01)
+            population.admirers(0, 0.5)
+
+
+def _bench_simulation(timer, count, workers, ticks=10):
+    # Villagers spread over a map of 64x64 chunks, walking across it
+    rng = numpy.random.RandomState(0)
+    state = township.simulation.empty_state()
+    state['ids'] = numpy.arange(count, dtype=numpy.int64)
+    state['position'] = rng.uniform(-8192, 8192, (count, 2))
+    state['target'] = rng.uniform(-8192, 8192, (count, 2))
+    state['velocity'] = vectors.normalised(state['target'] -
+                                           state['position'])
+    state['moving'] = numpy.ones(count, dtype=bool)
+    simulation = township.simulation.Simulation(state, workers=workers)
+    try:
+        for _ in range(timer.repeat):
+            with timer:
+                simulation.step(ticks)
+    finally:
+        simulation.close()
+
+
+benchmark('simulation_50000_1', count=50000, workers=1)(_bench_simulation)
+benchmark('simulation_50000', count=50000, workers=None)(_bench_simulation)
+
+
+# Start the map the same way mapgen.py does, minus the user interface,
+# and draw the first frame.
+FIRST_FRAME_SCRIPT = """
+import pygame
+import township.conf
+import township.images
+import township.map
+pygame.display.init()
+surface = pygame.display.set_mode(%r)
+township.images.load_terrain()
+township.images.load_map_resources()
+game_map = township.map.Map(township.conf.SEED, generate=False)
+game_map.update(surface, 0, 0)
+game_map.draw(surface, 0, 0, pygame.Surface(%r))
+""" % (VIEWPORT_SIZE, MINIMAP_SIZE)
+
+
+@benchmark('first_frame')
+def bench_first_frame(timer):
+    for _ in range(timer.repeat):
+        with timer:
+            subprocess.check_call([sys.executable, '-c', FIRST_FRAME_SCRIPT],
+                                  stdout=subprocess.DEVNULL)
+
+
+def run(names=None, repeat=5):
+    """Run the benchmarks, returning a dict of results.
+
+    :param names: Substrings to select the benchmarks to run by. All the
+    benchmarks are run if this is empty.
+    :param repeat: The number of times to run each benchmark.
+
+    """
+    results = {}
+    for name, func, kwargs in BENCHMARKS:
+        if names and not any(n in name for n in names):
+            continue
+        timer = Timer(repeat)
+        func(timer, **kwargs)
+        results[name] = timer.summary()
+        sys.stderr.write('%-20s %10.3f ms\n'
+                         % (name, results[name]['median'] * 1000))
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'time': time.time()
+        },
+        'results': results
+    }
+
+
+def compare(results, baseline, threshold):
+    """Compare results with a baseline, returning the regressions.
+
+    A benchmark has regressed if its median time has increased by more
+    than `threshold`, as a fraction of the baseline's median time.
+
+    """
+    regressions = []
+    for name, result in sorted(results['results'].items()):
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['median']
+        ratio = result['median'] / before
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        sys.stdout.write('%-20s %10.3f ms %10.3f ms %+7.1f%% %s\n' % (
+            name, before * 1000, result['median'] * 1000,
+            (ratio - 1) * 100, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*',
+                        help='only run benchmarks containing these names')
+    parser.add_argument('-o', '--output',
+                        help='write the results to this JSON file')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='number of runs of each benchmark')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare the results with a baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown which counts as a regression, as a '
+                             'fraction of the baseline (default: 0.1)')
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode(VIEWPORT_SIZE)
+    township.images.load_terrain()
+    township.images.load_map_resources()
+
+    results = run(args.names, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Pack the map images into the atlas loaded by the map generator.
+
+Run this from the root of the repository whenever the images change:
+
+    python buildatlas.py
+
+"""
+
+
+import argparse
+import os
+
+from township import conf
+from township.atlas import build_atlas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-o', '--output', default=conf.ATLAS_PATH,
+                        help='where to write the atlas (default: %s)'
+                             % conf.ATLAS_PATH)
+    args = parser.parse_args()
+
+    build_atlas({
+        'terrain': os.path.join('images', 'map'),
+        'resources': os.path.join('images', 'map', 'resources')
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Export an overview image of a rectangle of chunks.
+
+Each tile is one pixel, coloured as on the minimap. Example, exporting
+the 256x256 chunks around the origin to a 4096x4096 PNG:
+
+    python exportmap.py 123123456574 -128 -128 128 128 world.png
+
+"""
+
+
+import argparse
+import sys
+
+from township.export import export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('seed', type=int, help='the world seed')
+    parser.add_argument('x0', type=int, help='first chunk column')
+    parser.add_argument('y0', type=int, help='first chunk row')
+    parser.add_argument('x1', type=int, help='chunk column to stop at')
+    parser.add_argument('y1', type=int, help='chunk row to stop at')
+    parser.add_argument('output',
+                        help='image to write, PNG if it ends in .png and '
+                             'raw RGB otherwise')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: all '
+                             'cores)')
+    args = parser.parse_args()
+
+    def progress(done, total):
+        sys.stdout.write('\r%d/%d rows of chunks' % (done, total))
+        sys.stdout.flush()
+
+    rect = (args.x0, args.y0, args.x1, args.y1)
+    width, height = export(args.seed, rect, args.output,
+                           workers=args.workers, progress=progress)
+    sys.stdout.write('\rWrote %dx%d image to %s\n'
+                     % (width, height, args.output))
+
+
+if __name__ == '__main__':
+    main()
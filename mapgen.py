@@ -14,19 +14,111 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+"""Run the map viewer.
+
+Record the input of a session, for reproducing a performance problem:
+
+    python mapgen.py --record session.rec
+
+Replay it as fast as possible without a window, reporting frame times:
+
+    python mapgen.py --replay session.rec --timings timings.json
+
+Saving is disabled while recording or replaying, so that replays start
+from the same state as the recording did.
+
+"""
+
+
+import time
+
+start = time.time()
+
+import argparse
+import json
+import os
+
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--record', metavar='FILE',
+                    help='record the input of the session to a file')
+parser.add_argument('--replay', metavar='FILE',
+                    help='replay a recording headlessly and report frame '
+                         'times')
+parser.add_argument('--timings', metavar='FILE',
+                    help='write the frame times of a replay to a JSON file')
+args = parser.parse_args()
+
+if args.replay:
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
 import pygame
 import yamlui
 
+from township import conf
+from township import profiling
+from township import replay
+
+
+recorder = None
+frames = None
+if args.replay:
+    conf.SEED, frames = replay.load(args.replay)
+    conf.SAVE_PATH = None
+elif args.record:
+    conf.SAVE_PATH = None
+    recorder = replay.Recorder(args.record, conf.SEED)
 
 pygame.init()
 
-window = yamlui.generate_ui('data/ui/maptest.yaml', ['township'])
-clock = pygame.time.Clock()
-while True:
-    for event in pygame.event.get():
+window = yamlui.generate_ui('data/ui/maptest.yaml', ['township.ui'])
+
+
+def step(events):
+    for event in events:
         window.handle_event(event)
     window.image.fill((0, 0, 0))
     window.update()
     window.draw()
-    pygame.display.set_caption('%s' % clock.get_fps())
-    clock.tick()
+    profiling.end_frame()
+
+
+if frames is not None:
+    durations = []
+    for _, events in frames:
+        frame_start = time.perf_counter()
+        step(events)
+        durations.append(time.perf_counter() - frame_start)
+    results = {
+        'recorded': replay.summarise([duration for duration, _ in frames]),
+        'replayed': replay.summarise(durations),
+    }
+    for name, summary in sorted(results.items()):
+        print('%s: %d frames, median %.2fms, p99 %.2fms, max %.2fms' % (
+            name, summary['frames'], summary.get('median', 0) * 1000,
+            summary.get('p99', 0) * 1000, summary.get('max', 0) * 1000))
+    if args.timings:
+        results['frames'] = durations
+        with open(args.timings, 'w') as f:
+            json.dump(results, f, indent=2)
+    raise SystemExit(0)
+
+clock = pygame.time.Clock()
+first_frame = True
+try:
+    while True:
+        events = pygame.event.get()
+        if recorder is not None:
+            for event in events:
+                recorder.record(event)
+        step(events)
+        if first_frame:
+            print('Time to first frame: %.3fs' % (time.time() - start))
+            first_frame = False
+        pygame.display.set_caption('%s' % clock.get_fps())
+        clock.tick()
+        if recorder is not None:
+            recorder.end_frame()
+finally:
+    if recorder is not None:
+        recorder.close()
@@ -0,0 +1,61 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Pre-generate a rectangle of chunks into a chunk store.
+
+Example, generating the 64x64 chunks around the origin using every core:
+
+    python pregen.py 123123456574 -32 -32 32 32 chunks/
+
+"""
+
+
+import argparse
+import sys
+
+from township.chunkstore import ChunkStore
+from township.worldgen import pregenerate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('seed', type=int, help='the world seed')
+    parser.add_argument('x0', type=int, help='first chunk column')
+    parser.add_argument('y0', type=int, help='first chunk row')
+    parser.add_argument('x1', type=int, help='chunk column to stop at')
+    parser.add_argument('y1', type=int, help='chunk row to stop at')
+    parser.add_argument('store', help='directory of the chunk store')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: all '
+                             'cores)')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='regenerate chunks which are already stored')
+    args = parser.parse_args()
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            sys.stdout.write('\r%d/%d chunks' % (done, total))
+            sys.stdout.flush()
+
+    store = ChunkStore(args.store, args.seed)
+    rect = (args.x0, args.y0, args.x1, args.y1)
+    total = pregenerate(args.seed, rect, store, workers=args.workers,
+                        skip_existing=not args.overwrite, progress=progress)
+    sys.stdout.write('\rGenerated %d chunks\n' % total)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Rank world seeds by the terrain around the spawn point.
+
+Example, scanning 10000 seeds at low resolution and showing the best 20:
+
+    python seedscan.py 0 10000 --low-res --top 20
+
+"""
+
+
+import argparse
+import json
+import sys
+
+from township.seedscan import TILE_TYPES, scan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('first', type=int, help='first seed to scan')
+    parser.add_argument('last', type=int, help='seed to stop scanning at')
+    parser.add_argument('-r', '--radius', type=int, default=64,
+                        help='tiles around the spawn point to sample '
+                             '(default: 64)')
+    parser.add_argument('--low-res', action='store_true',
+                        help='sample every 4th tile with 3 octaves of noise')
+    parser.add_argument('-n', '--top', type=int, default=10,
+                        help='number of seeds to show (default: 10)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='number of worker processes (default: all '
+                             'cores)')
+    parser.add_argument('--json', action='store_true',
+                        help='output the statistics as JSON lines')
+    args = parser.parse_args()
+
+    step, octaves = (4, 3) if args.low_res else (1, 5)
+    results = scan(range(args.first, args.last), args.radius, step, octaves,
+                   args.workers)[:args.top]
+
+    if args.json:
+        for stats in results:
+            sys.stdout.write(json.dumps(stats, sort_keys=True) + '\n')
+        return
+
+    columns = TILE_TYPES + ['rocks', 'trees']
+    sys.stdout.write('%-14s %7s ' % ('seed', 'score') +
+                     ' '.join('%8s' % column for column in columns) +
+                     ' %8s\n' % 'water at')
+    for stats in results:
+        distance = stats['water_distance']
+        sys.stdout.write(
+            '%-14d %7.3f ' % (stats['seed'], stats['score']) +
+            ' '.join('%8.3f' % stats[column] for column in columns) +
+            ' %8s\n' % ('-' if distance is None else '%.0f' % distance))
+
+
+if __name__ == '__main__':
+    main()
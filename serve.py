@@ -0,0 +1,66 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run a map server which viewers can connect to.
+
+Example, serving a world on the default port:
+
+    python serve.py 123123456574
+
+"""
+
+
+import argparse
+import asyncio
+import os
+
+# The server doesn't open a window, but chunks still need a display to
+# convert their images for.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from township import conf
+from township import images
+from township.map import Map
+from township.server import MapServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('seed', type=int, nargs='?', default=conf.SEED,
+                        help='the world seed (default: %(default)s)')
+    parser.add_argument('--host', default=conf.SERVER_HOST,
+                        help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=conf.SERVER_PORT,
+                        help='port to listen on (default: %(default)s)')
+    parser.add_argument('--tick-rate', type=int,
+                        default=conf.SERVER_TICK_RATE,
+                        help='simulation ticks per second '
+                             '(default: %(default)s)')
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    images.load_terrain()
+    images.load_map_resources()
+
+    server = MapServer(Map(args.seed, generate=False), args.tick_rate)
+    print('Serving seed %d on %s:%d' % (args.seed, args.host, args.port))
+    asyncio.run(server.run(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
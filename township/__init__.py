@@ -1,4 +1,47 @@
-from . import constructions
-from . import images
-from . import map
-from . import ui
+"""The Township map generator.
+
+Submodules are imported the first time they are accessed as attributes
+of this package, so that importing `township` doesn't pull in pygame and
+the other dependencies of modules which aren't used. This relies on
+module `__getattr__`, which needs Python 3.7 or later, so code in the
+package imports the submodules it uses explicitly rather than depending
+on it.
+
+"""
+
+
+import importlib
+
+
+_submodules = [
+    'actors',
+    'atlas',
+    'chunkstore',
+    'conf',
+    'connectivity',
+    'constructions',
+    'export',
+    'images',
+    'lod',
+    'map',
+    'memory',
+    'mipmap',
+    'population',
+    'profiling',
+    'replay',
+    'resources',
+    'savegame',
+    'scheduler',
+    'seedscan',
+    'server',
+    'simulation',
+    'ui',
+    'util',
+    'worldgen',
+]
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -29,9 +29,17 @@ class Villager(Sprite):
     def __init__(self):
         Sprite.__init__(self)
 
+        # The Population this villager belongs to, which keeps its stats
+        # and relationships, and its index in it.
+        self.population = None
+        self.index = None
+
+        # Incremented whenever anything shown about the villager changes
+        self.version = 0
+
         # TODO(SotK): Generate names and stats
         self.name = 'Riofaal the Magnificent'
-        self.stats = {
+        self._stats = {
             'strength': 10,
             'dexterity': 10,
             'constitution': 10,
@@ -45,11 +53,12 @@ class Villager(Sprite):
         # doing, and how fast they're doing it.
         self.state = 'idle'
         self.velocity = Vector2(0, 0)
+        # Reused every tick for the distance to the target
+        self._to_target = Vector2(0, 0)
 
         # The following attributes describe the villager's place in the
         # social hierarchy of the township.
         self.role = 'chieftain'
-        self.relationships = {}
 
         # The following attributes describe aspects of the villager's state
         # which directly affect how it is rendered.
@@ -66,6 +75,50 @@ class Villager(Sprite):
         self.position = [500, 500]
         self.target = self.position
 
+    @property
+    def name(self):
+        """The villager's name."""
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+        self.version += 1
+
+    @property
+    def stats(self):
+        """A dictionary of the villager's stats.
+
+        Once the villager is in a population this is a copy, so stats are
+        changed by assigning a new dictionary rather than by changing it.
+
+        """
+        if self.population is None:
+            return self._stats
+        return self.population.get_stats(self.index)
+
+    @stats.setter
+    def stats(self, stats):
+        if self.population is None:
+            self._stats = stats
+        else:
+            self.population.set_stats(self.index, stats)
+
+    @property
+    def relationships(self):
+        """A dictionary of the villager's affinity for other villagers.
+
+        This is read only, relationships are changed through the villager's
+        population.
+
+        """
+        if self.population is None:
+            return {}
+        indices, affinities = self.population.relationships(self.index)
+        return dict((self.population.villagers[index], affinity)
+                    for index, affinity in zip(indices.tolist(),
+                                               affinities.tolist()))
+
     def __str__(self):
         return self.name
 
@@ -78,7 +131,7 @@ class Villager(Sprite):
         if self.selected:
             circle(self.image, (255, 255, 255), (8, 8), 8, 1)
 
-    def update(self, xoffset, yoffset):
+    def update(self, xoffset, yoffset, scale=1):
         if self.dirty:
             self._redraw()
             self.dirty = False
@@ -86,20 +139,24 @@ class Villager(Sprite):
             self.position[0] += self.velocity.x
             self.position[1] += self.velocity.y
 
-            distance = Vector2.from_points(self.position, self.target)
-            if distance.magnitude <= 4:
+            # Stop within 4 pixels of the target
+            distance = self._to_target.set_from_points(self.position,
+                                                       self.target)
+            if distance.magnitude_squared <= 16:
                 self.state = 'idle'
                 self.target = self.position
 
         # Move the sprite into position, accounting for viewport offset
-        self.rect.x = self.position[0] + xoffset
-        self.rect.y = self.position[1] + yoffset
+        # and zoom
+        self.rect.x = (self.position[0] + xoffset) * scale
+        self.rect.y = (self.position[1] + yoffset) * scale
 
     def select(self):
         self.selected = not self.selected
         self.dirty = True
+        self.version += 1
 
     def move_to(self, x, y):
         self.state = 'moving'
         self.target = [x, y]
-        self.velocity = Vector2.from_points(self.position, (x, y)).normalised
+        self.velocity.set_from_points(self.position, self.target).normalise()
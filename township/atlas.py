@@ -0,0 +1,125 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Packing of map images into a single pre-decoded atlas file.
+
+An atlas file starts with a header giving the size of the atlas and the
+length of its index, followed by the index as JSON and then the raw RGBA
+pixels of the atlas. The index maps the name of every image to its
+rectangle in the atlas, grouped into `terrain` and `resources`.
+
+"""
+
+
+import json
+import os
+import struct
+
+import pygame
+
+
+MAGIC = b'TSAT'
+VERSION = 1
+HEADER = struct.Struct('<4sHIII')
+
+
+def _find_images(directory):
+    images = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.png'):
+            path = os.path.join(directory, name)
+            images[name[0:-len('.png')]] = pygame.image.load(path)
+    return images
+
+
+def _pack(sizes, width):
+    """Pack rectangles of the given sizes into shelves of a given width.
+
+    Returns the height of the packed area and a dict mapping keys of
+    `sizes` to (x, y) positions.
+
+    """
+    # Sort by height so that each shelf wastes as little space as
+    # possible, and by key so that the layout is stable.
+    order = sorted(sizes, key=lambda key: (-sizes[key][1], key))
+    positions = {}
+    x = y = shelf_height = 0
+    for key in order:
+        w, h = sizes[key]
+        if x + w > width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        positions[key] = (x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return y + shelf_height, positions
+
+
+def build_atlas(groups, path, width=256):
+    """Pack the PNG images in some directories into an atlas file.
+
+    :param groups: A dict mapping group names to directories of images.
+    :param path: The path to write the atlas to.
+    :param width: The width of the atlas in pixels.
+
+    """
+    images = {}
+    for group, directory in groups.items():
+        for name, image in _find_images(directory).items():
+            images[(group, name)] = image
+
+    sizes = dict((key, image.get_size()) for key, image in images.items())
+    height, positions = _pack(sizes, width)
+
+    pixels = bytearray(width * height * 4)
+    index = dict((group, {}) for group in groups)
+    for key, image in images.items():
+        x, y = positions[key]
+        w, h = sizes[key]
+        data = pygame.image.tostring(image, 'RGBA')
+        for row in range(0, h):
+            start = ((y + row) * width + x) * 4
+            pixels[start:start + w * 4] = data[row * w * 4:(row + 1) * w * 4]
+        index[key[0]][key[1]] = [x, y, w, h]
+
+    index_data = json.dumps(index, sort_keys=True).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, len(index_data)))
+        f.write(index_data)
+        f.write(pixels)
+
+
+def load_atlas(path):
+    """Load an atlas file with a single read.
+
+    Returns the atlas surface and its index. The surface is converted to
+    the display format, so the display must have been initialised.
+
+    :param path: The path of the atlas file.
+
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, width, height, index_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a version %d atlas' % (path, VERSION))
+    offset = HEADER.size
+    index = json.loads(data[offset:offset + index_length].decode('utf-8'))
+    offset += index_length
+    pixels = memoryview(data)[offset:offset + width * height * 4]
+    surface = pygame.image.frombuffer(pixels, (width, height), 'RGBA')
+    return surface.convert_alpha(), index
@@ -0,0 +1,187 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Storage for pre-generated chunks.
+
+A chunk store is a directory containing a manifest, which records the
+seed of the world the chunks belong to, and one file per chunk. Chunk
+files only depend on the seed and the position of the chunk, so a store
+is identical no matter how, or in which order, it was filled.
+
+"""
+
+
+import json
+import os
+import struct
+
+from township.map import TERRAINS
+from township.resources import Rock, Tree
+
+
+MAGIC = b'TSCK'
+VERSION = 3
+HEADER = struct.Struct('<4sHii')
+HEIGHTS = struct.Struct('<256d')
+TILES_PER_CHUNK = 256
+
+
+def _index(options, value):
+    # Index 0 means "no value", so shift everything else up by one.
+    if value is None:
+        return 0
+    return options.index(value) + 1
+
+
+def _value(options, index):
+    if index == 0:
+        return None
+    return options[index - 1]
+
+
+def pack_chunk(x, y, data):
+    """Serialise generated chunk content into bytes.
+
+    :param x: The x position of the chunk.
+    :param y: The y position of the chunk.
+    :param data: The chunk content, as returned by
+    `township.map.generate_chunk_data`.
+
+    """
+    heights = [tile[0] for tile in data]
+    terrains = bytearray(TERRAINS.index(tile[1]) for tile in data)
+    rocks = bytearray(_index(Rock.variations, tile[2]) for tile in data)
+    trees = bytearray(_index(Tree.variations, tile[3]) for tile in data)
+    neighbours = bytearray(tile[4] for tile in data)
+    return b''.join([
+        HEADER.pack(MAGIC, VERSION, x, y),
+        HEIGHTS.pack(*heights),
+        bytes(terrains),
+        bytes(rocks),
+        bytes(trees),
+        bytes(neighbours)
+    ])
+
+
+def unpack_chunk(payload):
+    """Deserialise chunk content created by `pack_chunk`.
+
+    Returns a tuple of (x, y, data), where `data` is in the same form as
+    the output of `township.map.generate_chunk_data`.
+
+    :param payload: The bytes to deserialise.
+
+    """
+    magic, version, x, y = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a version %d chunk file' % VERSION)
+    offset = HEADER.size
+    heights = HEIGHTS.unpack_from(payload, offset)
+    offset += HEIGHTS.size
+    terrains = bytearray(payload[offset:offset + TILES_PER_CHUNK])
+    offset += TILES_PER_CHUNK
+    rocks = bytearray(payload[offset:offset + TILES_PER_CHUNK])
+    offset += TILES_PER_CHUNK
+    trees = bytearray(payload[offset:offset + TILES_PER_CHUNK])
+    offset += TILES_PER_CHUNK
+    neighbours = bytearray(payload[offset:offset + TILES_PER_CHUNK])
+
+    data = []
+    for i in range(0, TILES_PER_CHUNK):
+        data.append((heights[i],
+                     TERRAINS[terrains[i]],
+                     _value(Rock.variations, rocks[i]),
+                     _value(Tree.variations, trees[i]),
+                     neighbours[i]))
+    return x, y, data
+
+
+class ChunkStore(object):
+
+    """A directory of pre-generated chunks for a single world seed."""
+
+    def __init__(self, path, seed):
+        """Open a chunk store, creating it if it doesn't exist.
+
+        :param path: The directory containing the store.
+        :param seed: The seed of the world. Opening an existing store
+        which was created for a different seed, or by a different version
+        of the generator, is an error.
+
+        """
+        self.path = path
+        self.seed = seed
+
+        manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest['seed'] != seed:
+                raise ValueError('Chunk store %s was generated with seed %s'
+                                 % (path, manifest['seed']))
+            if manifest.get('version') != VERSION:
+                raise ValueError('Chunk store %s is not a version %d store, '
+                                 'it needs generating again'
+                                 % (path, VERSION))
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            with open(manifest_path, 'w') as f:
+                json.dump({'seed': seed, 'version': VERSION}, f)
+
+    def _chunk_path(self, x, y):
+        return os.path.join(self.path, '%d_%d.chunk' % (x, y))
+
+    def __contains__(self, position):
+        return os.path.exists(self._chunk_path(*position))
+
+    def write(self, x, y, payload):
+        """Write a chunk which has already been packed with `pack_chunk`.
+
+        :param x: The x position of the chunk.
+        :param y: The y position of the chunk.
+        :param payload: The packed chunk.
+
+        """
+        path = self._chunk_path(x, y)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(payload)
+        os.rename(path + '.tmp', path)
+
+    def save(self, x, y, data):
+        """Save the content of a chunk.
+
+        :param x: The x position of the chunk.
+        :param y: The y position of the chunk.
+        :param data: The chunk content, as returned by
+        `township.map.generate_chunk_data`.
+
+        """
+        self.write(x, y, pack_chunk(x, y, data))
+
+    def load(self, x, y):
+        """Return the content of a chunk, or None if it isn't stored.
+
+        :param x: The x position of the chunk.
+        :param y: The y position of the chunk.
+
+        """
+        try:
+            with open(self._chunk_path(x, y), 'rb') as f:
+                payload = f.read()
+        except IOError:
+            return None
+        return unpack_chunk(payload)[2]
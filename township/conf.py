@@ -0,0 +1,127 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Settings for the map generator."""
+
+
+import os
+
+
+# The seed used to generate the world.
+SEED = 123123456574
+
+# The path to a chunk store filled by `pregen.py`, to load chunks from
+# rather than generating them. None to always generate chunks.
+CHUNK_STORE = None
+
+# The number of chunks which can be loaded before the chunks furthest
+# from the viewport are unloaded. Unloaded chunks are regenerated when
+# they are needed again.
+MAX_LOADED_CHUNKS = 400
+
+# The number of frames of profiling data to keep for export.
+PROFILE_HISTORY = 600
+
+# Where to write profiling data when it is exported.
+PROFILE_EXPORT_PATH = 'profile.json'
+
+# Chunks within this many chunks of the centre of the viewport are
+# loaded in the background, a few per frame. The square this covers
+# should fit comfortably within MAX_LOADED_CHUNKS.
+STREAM_RADIUS = 5
+
+# The number of background chunks to load per frame.
+STREAM_CHUNKS_PER_FRAME = 1
+
+# The image atlas built by `buildatlas.py`. Images are loaded from the
+# individual PNG files if it doesn't exist.
+ATLAS_PATH = os.path.join('images', 'map.atlas')
+
+# The most zoomed out level the map can be viewed at. At level n, the map
+# is drawn at a scale of 1 / 2**n.
+MAX_ZOOM_LEVEL = 3
+
+# The number of downscaled mip tiles to keep for zoomed out views.
+MIPMAP_CACHE_SIZE = 256
+
+# The number of mip tiles which can be built in a single frame.
+MIPMAP_BUILDS_PER_FRAME = 2
+
+# The time to spend rendering dirty chunks each frame, in milliseconds.
+# Chunks which don't get rendered in time are drawn as they were until a
+# later frame gets to them.
+RENDER_BUDGET_MS = 4
+
+# The directory to save the game in. The game is loaded from here on
+# startup if there is a save, using the save's seed rather than SEED.
+# None to disable saving.
+SAVE_PATH = 'save'
+
+# The number of seconds between autosaves. Only what has changed since
+# the previous save is written, and F5 saves straight away.
+AUTOSAVE_INTERVAL = 60
+
+# The address and port `serve.py` listens on by default.
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 7878
+
+# The number of simulation ticks per second run by the map server.
+SERVER_TICK_RATE = 20
+
+# The largest region, in chunks across, a client can subscribe to.
+SERVER_MAX_REGION = 32
+
+# Clients with more than this many bytes waiting to be sent to them are
+# disconnected, rather than slowing the simulation down for everyone.
+SERVER_MAX_BUFFER = 4 * 1024 * 1024
+
+# The number of chunks the map server generates and compresses per tick
+# for subscribed clients. The rest wait for later ticks, so that a large
+# subscription doesn't hold up the simulation.
+SERVER_CHUNKS_PER_TICK = 1
+
+# The number of compressed chunk messages the map server keeps to share
+# between clients. The least recently sent are dropped first.
+SERVER_CHUNK_CACHE_SIZE = 4096
+
+# The width and height, in chunks, of the regions the world is divided
+# into for simulating actors across multiple processes.
+SHARD_REGION_SIZE = 16
+
+# The width and height, in regions, of the blocks of neighbouring regions
+# which are simulated by the same worker process.
+SHARD_BLOCK_SIZE = 2
+
+# Chunks within this many chunks of the centre of the viewport, but
+# outside STREAM_RADIUS, are shown on the minimap using coarse chunks
+# which only sample the terrain every COARSE_STEP tiles. They are
+# replaced by full chunks when they come within STREAM_RADIUS.
+MINIMAP_RADIUS = 8
+COARSE_STEP = 2
+
+# The number of coarse chunks to make per frame.
+COARSE_CHUNKS_PER_FRAME = 8
+
+# From this zoom level up, mip tiles away from the loaded chunks are
+# built from coarsely sampled terrain, using this many octaves of noise.
+COARSE_ZOOM_LEVEL = 2
+COARSE_MIP_OCTAVES = 3
+
+# Actors more than a chunk away from the view are only updated every
+# this many frames, catching up on the frames they missed all at once.
+# Actors move a pixel per frame, so this must be less than 256 for them
+# to be caught up before they come into view.
+ACTOR_LOD_INTERVAL = 30
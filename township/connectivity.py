@@ -0,0 +1,254 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""An index of which tiles are connected to each other.
+
+Each loaded chunk has its connected areas labelled when it is added, and
+the labels are joined up across chunk borders with a union-find structure,
+so finding out whether two tiles are connected is a couple of dictionary
+lookups. Only loaded chunks are indexed, so areas which are connected
+through chunks that aren't loaded look separate. Removing a chunk only
+joins up again the areas which were connected to it.
+
+Tiles are grouped into areas by their passability, which is either
+`WATER` or `LAND`, from their type. Tiles of other types, such as
+mountains, are impassable and aren't part of any area. Connected water
+tiles form water bodies, and connected land tiles form the walkable
+areas, such as islands.
+
+"""
+
+
+WATER = 'water'
+LAND = 'land'
+
+# The passability of each tile type. Types which aren't here are
+# impassable.
+PASSABILITY = {
+    'water': WATER,
+    'sand': LAND,
+    'grass': LAND,
+    'upland': LAND,
+}
+
+
+def label_chunk(chunk):
+    """Label the connected areas of a single chunk.
+
+    Returns a tuple of (labels, passability), which are lists of columns
+    of tiles like `chunk.tiles`. Each connected area of tiles with the same
+    passability has a different label, starting from 1. Impassable tiles
+    are labelled 0 and have a passability of None.
+
+    :param chunk: The chunk to label.
+
+    """
+    passability = [[PASSABILITY.get(tile.type) for tile in col]
+                   for col in chunk.tiles]
+    labels = [[0] * 16 for _ in range(0, 16)]
+    count = 0
+    for x in range(0, 16):
+        for y in range(0, 16):
+            kind = passability[x][y]
+            if kind is None or labels[x][y]:
+                continue
+            count += 1
+            labels[x][y] = count
+            stack = [(x, y)]
+            while stack:
+                u, v = stack.pop()
+                for nu, nv in ((u - 1, v), (u + 1, v), (u, v - 1), (u, v + 1)):
+                    if (0 <= nu < 16 and 0 <= nv < 16 and
+                            not labels[nu][nv] and
+                            passability[nu][nv] == kind):
+                        labels[nu][nv] = count
+                        stack.append((nu, nv))
+    return labels, passability
+
+
+class ConnectivityIndex(object):
+
+    """Connected areas of the loaded chunks of a map."""
+
+    def __init__(self):
+        # The labels and passability of each indexed chunk, keyed by
+        # chunk position.
+        self.chunks = {}
+        # The union-find forest of areas, where an area is a tuple of
+        # (chunk x, chunk y, label).
+        self._parent = {}
+        # The areas in each tree of the forest, keyed by root. Union-find
+        # can't split areas, so these are used to rebuild just the trees
+        # which contained a removed chunk.
+        self._members = {}
+
+    def _find(self, area):
+        parent = self._parent
+        root = area
+        while parent[root] != root:
+            root = parent[root]
+        while parent[area] != root:
+            parent[area], area = root, parent[area]
+        return root
+
+    def _union(self, a, b):
+        a = self._find(a)
+        b = self._find(b)
+        if a != b:
+            # Always keep the smaller root, so the result doesn't depend
+            # on the order chunks were added in.
+            if b < a:
+                a, b = b, a
+            self._parent[b] = a
+            self._members[a] |= self._members.pop(b)
+
+    def _areas(self, position):
+        labels = self.chunks[position][0]
+        count = max(max(col) for col in labels)
+        return [(position[0], position[1], label)
+                for label in range(1, count + 1)]
+
+    def _add_areas(self, areas):
+        for area in areas:
+            self._parent[area] = area
+            self._members[area] = set([area])
+
+    def _stitch(self, first, second):
+        """Join the areas along the border of two neighbouring chunks.
+
+        `second` must be to the right of or below `first`.
+
+        """
+        labels_a, passability_a = self.chunks[first]
+        labels_b, passability_b = self.chunks[second]
+        for i in range(0, 16):
+            if second[0] > first[0]:
+                a, b = (15, i), (0, i)
+            else:
+                a, b = (i, 15), (i, 0)
+            kind = passability_a[a[0]][a[1]]
+            if kind is not None and kind == passability_b[b[0]][b[1]]:
+                self._union((first[0], first[1], labels_a[a[0]][a[1]]),
+                            (second[0], second[1], labels_b[b[0]][b[1]]))
+
+    def _stitch_neighbours(self, position, before_only=False):
+        x, y = position
+        neighbours = [((x - 1, y), position), ((x, y - 1), position)]
+        if not before_only:
+            neighbours += [(position, (x + 1, y)), (position, (x, y + 1))]
+        for first, second in neighbours:
+            if first in self.chunks and second in self.chunks:
+                self._stitch(first, second)
+
+    def _rebuild(self, areas):
+        """Split the given areas apart, then join them up again.
+
+        `areas` must be whole trees of the forest, so that no other tree
+        has an area bordering them.
+
+        """
+        for area in areas:
+            del self._parent[area]
+            self._members.pop(area, None)
+        self._add_areas(areas)
+        for position in set((x, y) for x, y, _ in areas):
+            self._stitch_neighbours(position, before_only=True)
+
+    def add_chunk(self, chunk):
+        """Label a newly loaded chunk and join it to its neighbours.
+
+        :param chunk: The chunk to add.
+
+        """
+        position = (chunk.x, chunk.y)
+        if position in self.chunks:
+            self.remove_chunk(chunk.x, chunk.y)
+        self.chunks[position] = label_chunk(chunk)
+        self._add_areas(self._areas(position))
+        self._stitch_neighbours(position)
+
+    def remove_chunk(self, chunk_x, chunk_y):
+        """Stop indexing a chunk which has been unloaded.
+
+        Only the areas which were connected to the chunk are joined up
+        again, since removing it may have split them.
+
+        :param chunk_x: The x position of the chunk.
+        :param chunk_y: The y position of the chunk.
+
+        """
+        position = (chunk_x, chunk_y)
+        if position not in self.chunks:
+            return
+        removed = self._areas(position)
+        affected = set()
+        for area in removed:
+            root = self._find(area)
+            if root in self._members:
+                affected |= self._members.pop(root)
+        for area in removed:
+            del self._parent[area]
+            affected.discard(area)
+        del self.chunks[position]
+        self._rebuild(affected)
+
+    def area(self, x, y):
+        """Return an identifier for the area containing a tile.
+
+        Tiles in the same area have equal identifiers. Returns None if the
+        tile is impassable or its chunk isn't indexed.
+
+        :param x: The x position of the tile, in tiles.
+        :param y: The y position of the tile, in tiles.
+
+        """
+        entry = self.chunks.get((x // 16, y // 16))
+        if entry is None:
+            return None
+        label = entry[0][x % 16][y % 16]
+        if not label:
+            return None
+        return self._find((x // 16, y // 16, label))
+
+    def passability(self, x, y):
+        """Return the passability of a tile, or None if it isn't indexed.
+
+        :param x: The x position of the tile, in tiles.
+        :param y: The y position of the tile, in tiles.
+
+        """
+        entry = self.chunks.get((x // 16, y // 16))
+        if entry is None:
+            return None
+        return entry[1][x % 16][y % 16]
+
+    def connected(self, a, b):
+        """Return True if two tiles are in the same area.
+
+        :param a: The (x, y) position of the first tile, in tiles.
+        :param b: The (x, y) position of the second tile, in tiles.
+
+        """
+        area = self.area(*a)
+        return area is not None and area == self.area(*b)
+
+    def reachable(self, a, b):
+        """Return True if one tile can be walked to from another.
+
+        :param a: The (x, y) position of the tile to start from, in tiles.
+        :param b: The (x, y) position of the tile to reach, in tiles.
+
+        """
+        return self.passability(*a) == LAND and self.connected(a, b)
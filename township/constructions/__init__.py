@@ -1 +1,2 @@
 from .stockpile import Stockpile
+from .table import ConstructionTable
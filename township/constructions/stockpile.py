@@ -19,16 +19,21 @@ class Stockpile(object):
     """A resource stockpile, for storing gathered wood and stone."""
 
     def __init__(self, tiles):
-        """Initialize a stockpile, adding it to the content of each tile.
+        """Initialize a stockpile.
+
+        The stockpile isn't on the map until it is placed there with
+        `township.map.Map.place`.
 
         :param tiles: The tiles covered by this stockpile.
 
         """
         self.selected = False
         self.tiles = tiles
-        for tile in tiles:
-            tile.content.append(self)
-            tile.chunk.dirty = True
+        # The stockpile's id in the map's ConstructionTable once placed
+        self.id = None
+        # Incremented whenever anything shown about the stockpile changes,
+        # which anything changing its content must do too.
+        self.version = 0
 
         # TODO(SotK): Don't hardcode the maximum contents
         self.content = [None for tile in tiles]
@@ -37,8 +42,15 @@ class Stockpile(object):
     def __repr__(self):
         return 'Stockpile, %d spaces' % len(self.content)
 
+    def overlay_alpha(self):
+        """Return the alpha of the shade drawn over this stockpile's tiles."""
+        if self.selected:
+            return 96
+        return 64
+
     def select(self):
         """Select this stockpile."""
         self.selected = not self.selected
+        self.version += 1
         for tile in self.tiles:
             tile.chunk.dirty = True
@@ -0,0 +1,71 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy
+
+
+class ConstructionTable(object):
+
+    """The constructions on a map, each with a numeric id.
+
+    Chunks record which construction covers each of their tiles as an
+    array of ids, so that finding what is on a tile doesn't involve
+    searching anything. Ids start at 1, with 0 meaning nothing.
+
+    """
+
+    def __init__(self):
+        self._constructions = [None]
+
+    def __len__(self):
+        return len(self._constructions) - 1
+
+    def __iter__(self):
+        return iter(self._constructions[1:])
+
+    def add(self, construction):
+        """Add a construction to the table, returning its new id.
+
+        :param construction: The construction to add.
+
+        """
+        construction.id = len(self._constructions)
+        self._constructions.append(construction)
+        return construction.id
+
+    def get(self, construction_id):
+        """Return the construction with a given id, or None for id 0.
+
+        :param construction_id: The id of the construction.
+
+        """
+        return self._constructions[construction_id]
+
+    def shades(self, ids):
+        """Return the alpha of the overlay drawn for each of some ids.
+
+        Returns a lookup array indexed by id, with entries for each of the
+        given ids and 0 elsewhere.
+
+        :param ids: An array of construction ids.
+
+        """
+        lookup = numpy.zeros(len(self._constructions), dtype=numpy.uint8)
+        for construction_id in ids.tolist():
+            if construction_id:
+                construction = self._constructions[construction_id]
+                lookup[construction_id] = construction.overlay_alpha()
+        return lookup
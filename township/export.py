@@ -0,0 +1,166 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Export of large overview images of the world.
+
+The image is rendered in the same way as the minimap, one pixel per
+tile. Rows of chunks are rendered in parallel by worker processes and
+written out as soon as they are ready. Only a fixed number of rows are
+handed to the workers ahead of the one being written, so only a handful
+of rows are in memory at any time, however large the exported area is
+and however slowly it is written.
+
+"""
+
+
+import collections
+import multiprocessing
+import struct
+import zlib
+
+from township.map import make_generators, pixel_colours, sample_terrain
+
+
+# The noise generators of a worker process, see `_init_worker`.
+_generators = None
+
+
+def _init_worker(seed):
+    global _generators
+    _generators = make_generators(seed)
+
+
+def _render_row(args):
+    x0, x1, chunk_y = args
+    heights, rocks, trees = sample_terrain(
+        16 * x0, 16 * chunk_y, 16 * (x1 - x0), 16, *_generators)
+    # Arrays are indexed by x first, images by y first.
+    return pixel_colours(heights, rocks, trees).transpose(1, 0, 2).tobytes()
+
+
+def render_rows(seed, rect, workers=None):
+    """Render the rows of pixels in a rectangle of chunks.
+
+    This is a generator which yields the pixels of each row of chunks in
+    order from top to bottom, as 8-bit RGB bytes for 16 rows of pixels.
+
+    :param seed: The seed of the world.
+    :param rect: The (x0, y0, x1, y1) rectangle of chunks to render.
+    :param workers: The number of worker processes to use. Defaults to
+    the number of CPUs. If this is 1 no processes are started.
+
+    """
+    x0, y0, x1, y1 = rect
+    rows = [(x0, x1, chunk_y) for chunk_y in range(y0, y1)]
+    if workers == 1:
+        _init_worker(seed)
+        for row in rows:
+            yield _render_row(row)
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker, (seed,))
+    window = 2 * (workers or multiprocessing.cpu_count())
+    rows = iter(rows)
+    pending = collections.deque()
+    try:
+        for row in rows:
+            pending.append(pool.apply_async(_render_row, (row,)))
+            if len(pending) >= window:
+                break
+        while pending:
+            pixels = pending.popleft().get()
+            # Only render another row once one has been taken off
+            for row in rows:
+                pending.append(pool.apply_async(_render_row, (row,)))
+                break
+            yield pixels
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _png_chunk(f, chunk_type, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def write_png(f, width, height, rows, flush_size=1 << 20):
+    """Write an RGB PNG image from an iterable of blocks of pixel rows.
+
+    :param f: The file to write to, opened in binary mode.
+    :param width: The width of the image in pixels.
+    :param height: The height of the image in pixels.
+    :param rows: An iterable of bytes, each containing one or more rows
+    of 8-bit RGB pixels.
+    :param flush_size: How much compressed data to buffer before writing
+    an IDAT chunk.
+
+    """
+    f.write(b'\x89PNG\r\n\x1a\n')
+    _png_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                       8, 2, 0, 0, 0))
+    compressor = zlib.compressobj()
+    stride = width * 3
+    pending = []
+    pending_size = 0
+    for block in rows:
+        for start in range(0, len(block), stride):
+            # Each row starts with its filter type, which is always none
+            data = compressor.compress(b'\x00' + block[start:start + stride])
+            pending.append(data)
+            pending_size += len(data)
+        if pending_size >= flush_size:
+            _png_chunk(f, b'IDAT', b''.join(pending))
+            pending = []
+            pending_size = 0
+    pending.append(compressor.flush())
+    _png_chunk(f, b'IDAT', b''.join(pending))
+    _png_chunk(f, b'IEND', b'')
+
+
+def export(seed, rect, path, workers=None, progress=None):
+    """Export an overview image of a rectangle of chunks.
+
+    The image is a PNG if the path ends in ``.png``, otherwise it is raw
+    8-bit RGB pixels with no header.
+
+    :param seed: The seed of the world.
+    :param rect: The (x0, y0, x1, y1) rectangle of chunks to export.
+    :param path: The path of the image to write.
+    :param workers: The number of worker processes to use.
+    :param progress: A callable called with (done, total) after each row
+    of chunks is written.
+
+    """
+    x0, y0, x1, y1 = rect
+    width = 16 * (x1 - x0)
+    height = 16 * (y1 - y0)
+
+    def rows():
+        for done, pixels in enumerate(render_rows(seed, rect, workers), 1):
+            yield pixels
+            if progress is not None:
+                progress(done, y1 - y0)
+
+    with open(path, 'wb') as f:
+        if path.endswith('.png'):
+            write_png(f, width, height, rows())
+        else:
+            for pixels in rows():
+                f.write(pixels)
+    return width, height
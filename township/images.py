@@ -19,39 +19,98 @@ import os
 import pygame
 import six
 
+from township import atlas
+from township import conf
 
+
+# Decoded images, keyed by name. If there is an atlas, these are all
+# subsurfaces of it, or of its opaque copy for terrain. Otherwise images
+# are only decoded the first time they are requested, using the paths
+# indexed by `load_terrain` and `load_map_resources`.
 terrain = {}
 map_resources = {}
 
-def load_terrain():
-    terraindir = os.path.join('images', 'map')
-    for name in os.listdir(terraindir):
-        path = os.path.join(terraindir, name)
+# The paths of the images which exist, keyed by name. Images from the
+# atlas are already decoded, so their paths are None.
+_terrain_paths = {}
+_map_resource_paths = {}
+_terrain_matches = {}
+
+_atlas_surface = None
+# The atlas without its alpha channel, which terrain tiles are taken from
+# since they are opaque and blit faster without one.
+_terrain_atlas = None
+
+
+def _index_images(directory, paths):
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
         if path.endswith('.png'):
-            tile = pygame.image.load(path).convert_alpha()
-            name = name.rstrip('.png')
-            terrain[name] = tile
+            paths[name[0:-len('.png')]] = path
+
+
+def _decode(cache, paths, name, opaque=False):
+    if name not in cache:
+        image = pygame.image.load(paths[name])
+        # Opaque images blit much faster without an alpha channel
+        cache[name] = image.convert() if opaque else image.convert_alpha()
+    return cache[name]
+
+
+def _load_atlas():
+    """Load every image from the atlas, if there is one.
+
+    Returns True if the images were loaded from the atlas.
+
+    """
+    global _atlas_surface, _terrain_atlas
+    if _atlas_surface is not None:
+        return True
+    if not os.path.exists(conf.ATLAS_PATH):
+        return False
+    _atlas_surface, index = atlas.load_atlas(conf.ATLAS_PATH)
+    _terrain_atlas = _atlas_surface.convert()
+    for cache, paths, group, source in (
+            (terrain, _terrain_paths, 'terrain', _terrain_atlas),
+            (map_resources, _map_resource_paths, 'resources',
+             _atlas_surface)):
+        for name, rect in six.iteritems(index[group]):
+            cache[name] = source.subsurface(pygame.Rect(rect))
+            paths[name] = None
+    _terrain_matches.clear()
+    return True
+
+
+def load_terrain():
+    """Find the terrain images, ready to be decoded when first used."""
+    if _load_atlas():
+        return
+    _index_images(os.path.join('images', 'map'), _terrain_paths)
+    _terrain_matches.clear()
 
 
 def load_map_resources():
-    map_resources_dir = os.path.join('images', 'map', 'resources')
-    for name in os.listdir(map_resources_dir):
-        path = os.path.join(map_resources_dir, name)
-        if path.endswith('.png'):
-            image = pygame.image.load(path).convert_alpha()
-            name = name[0:-len('.png')]
-            map_resources[name] = image
+    """Find the map resource images, ready to be decoded when first used."""
+    if _load_atlas():
+        return
+    _index_images(os.path.join('images', 'map', 'resources'),
+                  _map_resource_paths)
 
 
 def get_terrain(terraintype='grass'):
-    for key in six.iterkeys(terrain):
-        if terraintype in key:
-            return terrain[key]
-    return None
+    if terraintype not in _terrain_matches:
+        _terrain_matches[terraintype] = None
+        for key in six.iterkeys(_terrain_paths):
+            if terraintype in key:
+                _terrain_matches[terraintype] = key
+                break
+    key = _terrain_matches[terraintype]
+    if key is None:
+        return None
+    return _decode(terrain, _terrain_paths, key, opaque=True)
 
 
 def get_map_resource(type='rock'):
-    for key in six.iterkeys(map_resources):
-        if type == key:
-            return map_resources[key]
-    return None
+    if type not in _map_resource_paths:
+        return None
+    return _decode(map_resources, _map_resource_paths, type)
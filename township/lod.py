@@ -0,0 +1,119 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Level of detail for updating actors.
+
+Only the actors near the view need updating every frame, since the rest
+can't be seen. The actors of a map are split into those in or near the
+view, which are updated every frame as normal, and the rest, which are
+left alone. Every `conf.ACTOR_LOD_INTERVAL` frames, and whenever the view
+moves onto another chunk, the actors which were left alone are caught up
+on the ticks they missed in a single batch with `township.simulation`,
+and the actors are split again.
+
+Catching up uses the same arithmetic as `Villager.update`, so an actor
+which comes back into view is exactly where it would have been if it had
+been updated every frame, in the same state. Actors only move a pixel a
+tick, and the view is surrounded by a margin of a chunk, so no actor can
+walk into view between two splits without being updated.
+
+"""
+
+
+import pygame
+
+from township import conf
+from township import profiling
+from township import simulation
+
+
+class ActorScheduler(object):
+
+    """Updates a map's actors at full rate only when near the view."""
+
+    def __init__(self, game_map, interval=None):
+        """Initialise the scheduler.
+
+        :param game_map: The map whose actors to update.
+        :param interval: The largest number of frames to leave actors
+        away from the view without updating them. Defaults to
+        `conf.ACTOR_LOD_INTERVAL`.
+
+        """
+        self.map = game_map
+        self.interval = interval or conf.ACTOR_LOD_INTERVAL
+        # The actors in or near the view, which are updated every frame.
+        self.visible = pygame.sprite.Group()
+        # The moving actors away from the view, which are `self.lag`
+        # ticks behind the visible ones.
+        self.distant = []
+        self.lag = 0
+        self._bounds = None
+        self._count = 0
+
+    def synchronise(self):
+        """Bring every distant actor up to date with the visible ones.
+
+        This needs to happen before anything else looks at or changes the
+        state of the actors, such as giving them orders or saving them.
+
+        """
+        if self.lag and self.distant:
+            with profiling.span('actors_catch_up'):
+                state = simulation.from_actors(self.distant)
+                for _ in range(0, self.lag):
+                    state = simulation.step(state)
+                simulation.apply_to_actors(state, self.distant)
+            profiling.count('actors_caught_up', len(self.distant))
+        self.lag = 0
+
+    def _split(self, bounds):
+        self.synchronise()
+        x0, y0, x1, y1 = bounds
+        self.visible.empty()
+        self.distant = []
+        for actor in self.map.actors:
+            x = actor.position[0] // (16 * 16)
+            y = actor.position[1] // (16 * 16)
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                self.visible.add(actor)
+            else:
+                # Idle actors don't change until they're given an
+                # order, which synchronises them first.
+                if actor.state == 'moving':
+                    self.distant.append(actor)
+        self._bounds = bounds
+        self._count = len(self.map.actors)
+
+    def run(self, xoffset, yoffset, scale, bounds):
+        """Advance the actors by a tick.
+
+        :param xoffset: The x offset of the view, in full size pixels.
+        :param yoffset: The y offset of the view, in full size pixels.
+        :param scale: The scale the map is drawn at.
+        :param bounds: The (x0, y0, x1, y1) chunk positions of the top
+        left and bottom right chunks in view, including a margin.
+
+        """
+        if (bounds != self._bounds or self.lag >= self.interval or
+                len(self.map.actors) != self._count):
+            self._split(bounds)
+        self.visible.update(xoffset, yoffset, scale)
+        if self.distant:
+            self.lag += 1
+        if profiling.enabled:
+            profiling.gauge('actors_visible', len(self.visible))
+            profiling.gauge('actors_distant', len(self.distant))
@@ -14,16 +14,27 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import math
 import random
 
+import numpy
 from opensimplex import OpenSimplex
 import pygame
 
 from township import conf
+from township import connectivity
 from township import images
+from township import lod
+from township import memory
+from township import mipmap
+from township import population
+from township import profiling
+from township import scheduler
 from township.actors import Villager
-from township.constructions import Stockpile
+from township.constructions import ConstructionTable
 from township.resources import Rock, Tree
+from township.util import seeding
+from township.util import vectors
 
 
 class NoiseGenerator(object):
@@ -32,9 +43,13 @@ class NoiseGenerator(object):
 
     def __init__(self, seed):
         self.seed = seed
-        random.seed(seed)
-        self.octaves = [OpenSimplex(int(random.random()*1000))
+        rng = random.Random(seed)
+        self.octaves = [OpenSimplex(int(rng.random()*1000))
                         for i in range(0, 8)]
+        # Newer versions of opensimplex renamed noise2d to noise2, and
+        # can compute noise for a whole grid of points with noise2array.
+        self._noise2d = [getattr(octave, 'noise2d', None) or octave.noise2
+                         for octave in self.octaves]
 
     def noise2d(self, x, y, octaves=1, amplitude=0.5):
         """Return noise with the given number of octaves.
@@ -57,101 +72,396 @@ class NoiseGenerator(object):
         for i in range(0, octaves):
             f = 2**i
             divisor += 1.0 / f
-            result += self.octaves[i].noise2d(f*nx, f*ny) / f
+            result += self._noise2d[i](f*nx, f*ny) / f
         result /= divisor
 
         return result
 
+    def noise2d_grid(self, xs, ys, octaves=1, amplitude=0.5):
+        """Return noise for every combination of the given coordinates.
+
+        The result is a numpy array of shape (len(xs), len(ys)), where
+        ``result[i][j]`` is equal to ``noise2d(xs[i], ys[j])`` with the
+        same octaves and amplitude. The whole grid is computed at once if
+        the installed opensimplex supports it, which is far faster than
+        calling `noise2d` for each point.
+
+        :param xs: The x coordinates to get noise at.
+        :param ys: The y coordinates to get noise at.
+        :param octaves: The number of octaves of noise to use.
+        :param amplitude: The amplitude of the noise.
+
+        """
+        if octaves > 8:
+            octaves = 8
+
+        nx = (numpy.asarray(xs, dtype=float) / (200 * amplitude)) - amplitude
+        ny = (numpy.asarray(ys, dtype=float) / (200 * amplitude)) - amplitude
+        divisor = 0.0
+        result = numpy.zeros((len(nx), len(ny)))
+        for i in range(0, octaves):
+            f = 2**i
+            divisor += 1.0 / f
+            result += self._octave_grid(i, f*nx, f*ny) / f
+        result /= divisor
+
+        return result
+
+    def _octave_grid(self, i, nx, ny):
+        octave = self.octaves[i]
+        if hasattr(octave, 'noise2array'):
+            # noise2array indexes its result by y first
+            return octave.noise2array(nx, ny).T
+        noise = self._noise2d[i]
+        return numpy.array([[noise(x, y) for y in ny] for x in nx])
+
+
+def make_generators(seed):
+    """Make the height, rock and tree noise generators for a world seed.
+
+    :param seed: The seed of the world.
+
+    """
+    rng = random.Random(seed)
+    seeds = [rng.random() for _ in range(0, 3)]
+    return tuple(NoiseGenerator(s) for s in seeds)
+
+
+# The terrain bands used to decide the type and colour of a tile, as tuples
+# of (upper height bound, tile type, colour channels). The colour channels
+# say which of red, green and blue are set in the tile's single pixel
+# representation.
+TERRAIN_BANDS = [
+    (-0.075, 'water', (0, 0, 1)),
+    (-0.063, 'sand', (0, 0, 1)),
+    (-0.015, 'sand', (1, 1, 0)),
+    (0, 'grass', (1, 1, 0)),
+    (0.4, 'grass', (0, 1, 0)),
+    (0.46, 'upland', (1, 1, 1)),
+    (None, 'mountain', (1, 1, 1)),
+]
+
+# The classes tiles are grouped into for choosing their images, as tuples
+# of (upper height bound, base terrain, transition terrains). A tile which
+# borders tiles of a lower class uses one of its class' transitions
+# instead of the base terrain, going from the weakest to the strongest
+# blend with the lower class as more of its eight neighbours are lower.
+TERRAIN_CLASSES = [
+    (-0.075, 'ocean', []),
+    (-0.015, 'beach', ['water-sand-25', 'water-sand-50', 'water-sand-75']),
+    (0.4, 'grass', ['sand-grass-25', 'sand-grass-50', 'sand-grass-75']),
+    (None, 'cliffa', ['cliff-grass-75', 'cliff-grass-50', 'cliff-grass-25']),
+]
+
+# The offsets of the neighbours of a tile, in the order of their bits in
+# the masks returned by `neighbour_masks`, starting from north and going
+# clockwise.
+NEIGHBOURS = [(0, -1), (1, -1), (1, 0), (1, 1),
+              (0, 1), (-1, 1), (-1, 0), (-1, -1)]
+
+# Every terrain name a tile can end up with, in a fixed order.
+TERRAINS = ['ocean', 'water-sand-75', 'water-sand-50', 'water-sand-25',
+            'beach', 'sand-grass-75', 'sand-grass-50', 'sand-grass-25',
+            'cliff-grass-25', 'cliff-grass-50', 'cliff-grass-75', 'cliffa',
+            'grassa', 'grassb']
+
+
+# The height bounds and colour channels of the terrain bands as arrays,
+# for working with arrays of heights.
+_BAND_BOUNDS = numpy.array([band[0] for band in TERRAIN_BANDS[:-1]])
+_BAND_CHANNELS = numpy.array([band[2] for band in TERRAIN_BANDS])
+_CLASS_BOUNDS = numpy.array([cls[0] for cls in TERRAIN_CLASSES[:-1]])
+
+
+def get_terrain_band(height):
+    """Return the entry of `TERRAIN_BANDS` for a given height."""
+    for band in TERRAIN_BANDS:
+        if band[0] is None or height < band[0]:
+            return band
+
+
+def neighbour_masks(heights):
+    """Work out which neighbours of each tile are of a lower class.
+
+    `heights` is an array of tile heights with a border of one tile on
+    every side, so that the tiles at the edge of the area have all of
+    their neighbours. Returns a tuple of (classes, masks, counts), which
+    are arrays with the border removed. `classes` is the index in
+    `TERRAIN_CLASSES` of each tile, `masks` has the bit for each offset in
+    `NEIGHBOURS` set where that neighbour is of a lower class, and
+    `counts` is the number of bits set in each mask.
+
+    :param heights: A 2D array of heights indexed by x and then y.
+
+    """
+    classes = numpy.searchsorted(_CLASS_BOUNDS, heights, side='right')
+    width, height = classes.shape[0] - 2, classes.shape[1] - 2
+    inner = classes[1:-1, 1:-1]
+    masks = numpy.zeros((width, height), dtype=numpy.uint8)
+    counts = numpy.zeros((width, height), dtype=numpy.uint8)
+    for bit, (dx, dy) in enumerate(NEIGHBOURS):
+        lower = classes[1+dx:width+1+dx, 1+dy:height+1+dy] < inner
+        masks |= lower.astype(numpy.uint8) << bit
+        counts += lower
+    return inner, masks, counts
+
+
+def choose_terrain(cls, count, rng):
+    """Choose the terrain name for a tile.
+
+    :param cls: The index in `TERRAIN_CLASSES` of the tile.
+    :param count: How many neighbours of the tile are of a lower class.
+    :param rng: The random number generator to pick variants with.
+
+    """
+    _, terrain, transitions = TERRAIN_CLASSES[cls]
+    if count and transitions:
+        return transitions[min((count - 1) // 3, len(transitions) - 1)]
+    if terrain == 'grass':
+        terrain += 'a' if rng.random() > 0.1 else 'b'
+    return terrain
+
+
+def generate_chunk_data(x, y, height_gen, rock_gen, tree_gen):
+    """Generate the content of the chunk at (x, y) without rendering it.
+
+    All randomness comes from a generator seeded with the height seed and
+    the chunk position, so the result doesn't depend on what else has been
+    generated, or in which process. The noise for the whole chunk is
+    computed in one batch, along with the heights of the tiles bordering
+    it, so that transitions at the edge of the chunk match its neighbours
+    without needing them to be generated.
+
+    The result is a list of (height, terrain, rock, tree, neighbours)
+    tuples, one for each tile in the chunk, ordered by column and then by
+    row. `rock` and `tree` are the image variations of the resources on
+    the tile, or None. `neighbours` is the tile's mask from
+    `neighbour_masks`, kept so that directional transitions can be drawn.
+
+    :param x: The x position of the chunk.
+    :param y: The y position of the chunk.
+    :param height_gen: A NoiseGenerator to generate tile heights.
+    :param rock_gen: A NoiseGenerator to generate rocks.
+    :param tree_gen: A NoiseGenerator to generate trees.
+
+    """
+    rng = seeding.chunk_random(height_gen.seed, x, y)
+    xs = numpy.arange(16 * x - 1, 16 * x + 17)
+    ys = numpy.arange(16 * y - 1, 16 * y + 17)
+    border = height_gen.noise2d_grid(xs, ys, octaves=5)
+    classes, masks, counts = neighbour_masks(border)
+    classes, masks, counts = classes.tolist(), masks.tolist(), counts.tolist()
+    heights = border[1:-1, 1:-1].tolist()
+    rocks = rock_gen.noise2d_grid(xs[1:-1], ys[1:-1], octaves=5,
+                                  amplitude=0.025).tolist()
+    trees = tree_gen.noise2d_grid(xs[1:-1], ys[1:-1], octaves=5,
+                                  amplitude=0.05).tolist()
+    data = []
+    for u in range(0, 16):
+        for v in range(0, 16):
+            height = heights[u][v]
+            terrain = choose_terrain(classes[u][v], counts[u][v], rng)
+            rock = rocks[u][v]
+            rock_variation = None
+            if rock + height > 0.75:
+                rock_variation = Rock.get_variation(rng)
+            tree = trees[u][v]
+            tree_variation = None
+            if height > 0 and height < 0.45 and tree > 0.3:
+                if rock + height < 0.75:
+                    tree_variation = Tree.get_variation(rng)
+            data.append((height, terrain, rock_variation, tree_variation,
+                         masks[u][v]))
+    return data
+
+
+def sample_terrain(x, y, width, height, height_gen, rock_gen, tree_gen,
+                   step=1, octaves=5):
+    """Sample the terrain of a rectangle of tiles in one batch.
+
+    Returns a tuple of (heights, rocks, trees), which are numpy arrays of
+    shape (width, height) indexed by x and then y. `heights` contains the
+    height of each tile, and `rocks` and `trees` are boolean arrays which
+    say where the resources are. With the default `step` and `octaves`
+    these match what `generate_chunk_data` generates for the same tiles.
+
+    :param x: The x position of the top left tile.
+    :param y: The y position of the top left tile.
+    :param width: The width of the rectangle in tiles.
+    :param height: The height of the rectangle in tiles.
+    :param height_gen: A NoiseGenerator to generate tile heights.
+    :param rock_gen: A NoiseGenerator to generate rocks.
+    :param tree_gen: A NoiseGenerator to generate trees.
+    :param step: Only sample every `step`th tile in each direction. The
+    shape of the result is reduced to match.
+    :param octaves: The number of octaves of noise to use. Fewer octaves
+    are faster, but less accurate.
+
+    """
+    xs = numpy.arange(x, x + width, step)
+    ys = numpy.arange(y, y + height, step)
+    heights = height_gen.noise2d_grid(xs, ys, octaves=octaves)
+    rock = rock_gen.noise2d_grid(xs, ys, octaves=octaves, amplitude=0.025)
+    tree = tree_gen.noise2d_grid(xs, ys, octaves=octaves, amplitude=0.05)
+    return _place_resources(heights, rock, tree)
+
+
+def _place_resources(heights, rock, tree):
+    rocks = rock + heights > 0.75
+    trees = ((heights > 0) & (heights < 0.45) & (tree > 0.3) &
+             (rock + heights < 0.75))
+    return heights, rocks, trees
+
+
+def _interpolate(grid, fx, fy):
+    """Bilinearly interpolate a grid at fractional grid positions."""
+    x0 = numpy.floor(fx).astype(int)
+    y0 = numpy.floor(fy).astype(int)
+    x1 = numpy.minimum(x0 + 1, grid.shape[0] - 1)
+    y1 = numpy.minimum(y0 + 1, grid.shape[1] - 1)
+    tx = (fx - x0)[:, numpy.newaxis]
+    ty = (fy - y0)[numpy.newaxis, :]
+    near = grid[x0][:, y0] * (1 - ty) + grid[x0][:, y1] * ty
+    far = grid[x1][:, y0] * (1 - ty) + grid[x1][:, y1] * ty
+    return near * (1 - tx) + far * tx
+
+
+def sample_terrain_coarse(x, y, width, height, height_gen, rock_gen,
+                          tree_gen, step=2, octaves=5):
+    """Sample the terrain of a rectangle of tiles at a low level of detail.
+
+    The result is in the same form as the result of `sample_terrain`,
+    with a value for every tile, but noise is only computed for every
+    `step`th tile in each direction and interpolated in between. This is
+    much cheaper, and close enough for views which only show a pixel or
+    so for each tile.
+
+    :param x: The x position of the top left tile.
+    :param y: The y position of the top left tile.
+    :param width: The width of the rectangle in tiles.
+    :param height: The height of the rectangle in tiles.
+    :param height_gen: A NoiseGenerator to generate tile heights.
+    :param rock_gen: A NoiseGenerator to generate rocks.
+    :param tree_gen: A NoiseGenerator to generate trees.
+    :param step: The distance in tiles between the samples.
+    :param octaves: The number of octaves of noise to use.
+
+    """
+    # Sample one step past the end, so every tile is between two samples
+    xs = numpy.arange(x, x + width + step, step)
+    ys = numpy.arange(y, y + height + step, step)
+    fx = numpy.arange(0, width) / float(step)
+    fy = numpy.arange(0, height) / float(step)
+    fields = []
+    for generator, amplitude in ((height_gen, 0.5), (rock_gen, 0.025),
+                                 (tree_gen, 0.05)):
+        grid = generator.noise2d_grid(xs, ys, octaves=octaves,
+                                      amplitude=amplitude)
+        fields.append(_interpolate(grid, fx, fy))
+    return _place_resources(*fields)
+
+
+def classify_heights(heights):
+    """Return the index in `TERRAIN_BANDS` of each of an array of heights."""
+    return numpy.searchsorted(_BAND_BOUNDS, heights, side='right')
+
+
+def pixel_colours(heights, rocks, trees):
+    """Return the colours tiles are drawn with in `pixels` render mode.
+
+    The arguments are arrays in the form returned by `sample_terrain`.
+    The result is a numpy array of 8-bit RGB colours with an extra last
+    dimension of length 3.
+
+    """
+    c = (127 * heights) + 128
+    colours = c[..., numpy.newaxis] * _BAND_CHANNELS[classify_heights(heights)]
+    colours[rocks] = Rock.colour
+    colours[trees] = Tree.colour
+    return numpy.clip(colours, 0, 255).astype(numpy.uint8)
+
+
+# Shared translucent black tiles for shading selected and built on tiles,
+# keyed by alpha.
+_shades = {}
+
+
+def opaque_surface(size):
+    """Return a new opaque surface, in the display's pixel format if any.
+
+    Blitting between opaque surfaces of the same format is a plain copy,
+    which is much faster than blending every pixel with per-pixel alpha.
+
+    :param size: The (width, height) of the surface.
+
+    """
+    surface = pygame.Surface(size)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    return surface
+
+
+def shade(alpha):
+    """Return a tile sized surface which darkens what it is blitted on.
+
+    The surface is opaque black with a surface alpha, which blends faster
+    than per-pixel alpha, and is shared by every tile using that alpha.
+
+    :param alpha: The alpha of the shade, from 0 to 255.
+
+    """
+    surface = _shades.get(alpha)
+    if surface is None:
+        surface = opaque_surface(images.get_terrain().get_size())
+        surface.set_alpha(alpha)
+        _shades[alpha] = surface
+    return surface
+
 
 class Tile(object):
 
     """A representation of a single map tile."""
 
-    def __init__(self, chunk, x, y, height_gen):
-        """Initialize a tile, generating its metadata.
+    def __init__(self, chunk, x, y, height, terrain, neighbours=0):
+        """Initialize a tile.
 
         :param chunk: The chunk which contains this tile.
         :param x: The x position of this tile in the world.
         :param y: The y position of this tile in the world.
-        :param height_gen: A NoiseGenerator to generate the height of
-        the tile.
+        :param height: The height of the tile.
+        :param terrain: The name of the terrain image for the tile.
+        :param neighbours: The mask of the tile's neighbours which are of
+        a lower terrain class, as returned by `neighbour_masks`.
 
         """
         self.chunk = chunk
-        self.height_gen = height_gen
         self.x = x
         self.y = y
         self.selected = False
+        # Incremented whenever anything shown about the tile changes, so
+        # that text describing it only needs remaking when this does.
+        self.version = 0
 
-        self.content = []
-
-        self.height = self.height_gen.noise2d(x, y, octaves=5)
+        self.height = height
+        self.terrain = terrain
+        self.neighbours = neighbours
         self.get_image()
 
     def get_image(self):
-        # TODO(SotK): More sane system here
         c = (127 * self.height) + 128
-        if self.height < -0.10:
-            self.colour = [0, 0, c]
-            self.image = images.get_terrain('ocean')
-            self.type = 'water'
-        elif self.height < -0.088:
-            self.colour = [0, 0, c]
-            self.image = images.get_terrain('water-sand-75')
-            self.type = 'water'
-        elif self.height < -0.075:
-            self.colour = [0, 0, c]
-            self.image = images.get_terrain('water-sand-50')
-            self.type = 'water'
-        elif self.height < -0.063:
-            self.colour = [0, 0, c]
-            self.image = images.get_terrain('water-sand-25')
-            self.type = 'sand'
-        elif self.height < -0.05:
-            self.colour = [c, c, 0]
-            self.image = images.get_terrain('beach')
-            self.type = 'sand'
-        elif self.height < -0.035:
-            self.colour = [c, c, 0]
-            self.image = images.get_terrain('sand-grass-75')
-            self.type = 'sand'
-        elif self.height < -0.015:
-            self.colour = [c, c, 0]
-            self.image = images.get_terrain('sand-grass-50')
-            self.type = 'sand'
-        elif self.height < 0:
-            self.colour = [c, c, 0]
-            self.image = images.get_terrain('sand-grass-25')
-            self.type = 'grass'
-        elif self.height < 0.4:
-            self.colour = [0, c, 0]
-            ext = 'a' if random.random() > 0.1 else 'b'
-            self.image = images.get_terrain('grass' + ext)
-            self.type = 'grass'
-        elif self.height < 0.425:
-            self.colour = [c, c, c]
-            self.image = images.get_terrain('cliff-grass-25')
-            self.type = 'upland'
-        elif self.height < 0.46:
-            self.colour = [c, c, c]
-            self.image = images.get_terrain('cliff-grass-50')
-            self.type = 'upland'
-        elif self.height < 0.5:
-            self.colour = [c, c, c]
-            self.image = images.get_terrain('cliff-grass-75')
-            self.type = 'mountain'
-        else:
-            self.colour = [c, c, c]
-            self.image = images.get_terrain('cliffa')
-            self.type = 'mountain'
+        band = get_terrain_band(self.height)
+        self.colour = [c * channel for channel in band[2]]
+        self.image = images.get_terrain(self.terrain)
+        self.type = band[1]
 
     def select(self, select_items=True):
         if not self.selected and select_items:
-            for item in self.content:
-                if isinstance(item, Stockpile):
-                    item.select()
-                    return item
+            item = self.chunk.construction_at(self.x % 16, self.y % 16)
+            if item is not None:
+                item.select()
+                return item
         self.selected = not self.selected
+        self.version += 1
 
     def get_resource(self):
         return self.chunk.get_resource(self.x%16, self.y%16)
@@ -161,23 +471,9 @@ class Tile(object):
             surface.blit(self.image, ((self.x%16)*self.image.get_width(),
                                       (self.y%16)*self.image.get_height()))
             if self.selected:
-                selection_surface = pygame.Surface(
-                    (16, 16), flags=pygame.SRCALPHA)
-                selection_surface.fill((0, 0, 0, 128))
                 position = ((self.x%16)*self.image.get_width(),
                             (self.y%16)*self.image.get_height())
-                surface.blit(selection_surface, position)
-            for item in self.content:
-                if isinstance(item, Stockpile):
-                    stockpile_surface = pygame.Surface(
-                        (16, 16), flags=pygame.SRCALPHA)
-                    alpha = 64
-                    if item.selected:
-                        alpha = 96
-                    stockpile_surface.fill((0, 0, 0, alpha))
-                    position = ((self.x%16)*self.image.get_width(),
-                                (self.y%16)*self.image.get_height())
-                    surface.blit(stockpile_surface, position)
+                surface.blit(shade(128), position)
         elif rendermode == 'pixels':
             surface.set_at((self.x % 16, self.y % 16), self.colour)
         else:
@@ -197,7 +493,8 @@ class Chunk(object):
 
     """
 
-    def __init__(self, x, y, height_gen, rock_gen, tree_gen):
+    def __init__(self, x, y, height_gen, rock_gen, tree_gen, data=None,
+                 constructions=None):
         """Initialize a chunk, generating its contents.
 
         :param x: The x position of this chunk.
@@ -208,16 +505,35 @@ class Chunk(object):
         chunk.
         :param tree_gen: A NoiseGenerator to generate trees in this
         chunk.
+        :param data: Previously generated content for this chunk, as
+        returned by `generate_chunk_data`. If not given, the content is
+        generated using the noise generators.
+        :param constructions: The ConstructionTable of the map this chunk
+        is part of. Defaults to an empty table of its own.
 
         """
         self.x = x
         self.y = y
-        self.dirty = False
+        if constructions is None:
+            constructions = ConstructionTable()
+        self.constructions = constructions
+        # The id in `constructions` of the construction on each tile, or 0
+        self.occupancy = numpy.zeros((16, 16), dtype=numpy.uint32)
+        # Tiles are only rendered when the map's render scheduler gets
+        # round to it, so new chunks start out dirty.
+        self.dirty = True
+        # Incremented whenever the chunk is rendered, so that things
+        # derived from the chunk's surfaces can tell they're out of date.
+        # Chunks whose tiles have never been rendered are at version 0.
+        self.version = 0
 
         sample = images.get_terrain()
         size = (sample.get_width() * 16, sample.get_height() * 16)
-        self.tiled_surface = pygame.Surface(size, flags=pygame.SRCALPHA)
-        self.pixel_surface = pygame.Surface((16, 16), flags=pygame.SRCALPHA)
+        self.tiled_surface = opaque_surface(size)
+        self.pixel_surface = opaque_surface((16, 16))
+
+        if data is None:
+            data = generate_chunk_data(x, y, height_gen, rock_gen, tree_gen)
 
         # Chunks are 16x16 tiles, so the x positions of tiles
         # in a given chunk are from 16 * x to (16 * x) + 16. The
@@ -227,23 +543,20 @@ class Chunk(object):
         self.tiles = []
         self.rocks = []
         self.trees = []
+        tile_data = iter(data)
         for u in range(xoffset, xoffset+16):
             tile_col = []
             rock_col = []
             tree_col = []
             for v in range(yoffset, yoffset+16):
-                tile = Tile(self, u, v, height_gen)
-                rock = rock_gen.noise2d(u, v, octaves=5, amplitude=0.025)
-                if rock + tile.height > 0.75:
-                    rock_col.append(Rock(self, tile, u, v, 100))
+                height, terrain, rock, tree, neighbours = next(tile_data)
+                tile = Tile(self, u, v, height, terrain, neighbours)
+                if rock is not None:
+                    rock_col.append(Rock(self, tile, u, v, 100, rock))
                 else:
                     rock_col.append(None)
-                tree = tree_gen.noise2d(u, v, octaves=5, amplitude=0.05)
-                if tile.height > 0 and tile.height < 0.45 and tree > 0.3:
-                    if rock + tile.height < 0.75:
-                        tree_col.append(Tree(self, tile, u, v, 100))
-                    else:
-                        tree_col.append(None)
+                if tree is not None:
+                    tree_col.append(Tree(self, tile, u, v, 100, tree))
                 else:
                     tree_col.append(None)
                 tile_col.append(tile)
@@ -251,11 +564,41 @@ class Chunk(object):
             self.rocks.append(rock_col)
             self.trees.append(tree_col)
 
-        self.render()
+        self.render_pixels()
 
     def __repr__(self):
         return '<Chunk x=%s y=%s>' % (self.x, self.y)
 
+    def is_pinned(self):
+        """Return True if the chunk has state that regenerating would lose.
+
+        Chunk content is generated deterministically, so unmodified chunks
+        can be unloaded and generated again identically later on. Chunks
+        containing selected tiles or constructions can't be.
+
+        """
+        if self.occupancy.any():
+            return True
+        for col in self.tiles:
+            for tile in col:
+                if tile.selected:
+                    return True
+        return False
+
+    def get_data(self):
+        """Return the content of the chunk, as `generate_chunk_data` does."""
+        data = []
+        for u in range(0, 16):
+            for v in range(0, 16):
+                rock = self.rocks[u][v]
+                tree = self.trees[u][v]
+                data.append((self.tiles[u][v].height,
+                             self.tiles[u][v].terrain,
+                             rock.variation if rock is not None else None,
+                             tree.variation if tree is not None else None,
+                             self.tiles[u][v].neighbours))
+        return data
+
     def get_resource(self, x, y):
         """Get the resource at a given (x, y) position in the chunk.
 
@@ -278,12 +621,24 @@ class Chunk(object):
         """
         return self.tiles[x][y]
 
+    def construction_at(self, x, y):
+        """Get the construction on a given (x, y) position in the chunk.
+
+        Returns None if there is nothing built there.
+
+        :param x: The x position of the tile in the chunk.
+        :param y: The y position of the tile in the chunk.
+
+        """
+        return self.constructions.get(int(self.occupancy[x, y]))
+
     def render(self):
         """Render the chunks tiles onto the relevant surfaces."""
+        self.version += 1
         for col in self.tiles:
             for tile in col:
                 tile.draw(self.tiled_surface, rendermode='tiles')
-                tile.draw(self.pixel_surface, rendermode='pixels')
+        self.render_constructions()
         # TODO(SotK): Draw rocks and trees separately in a resource
         # overlay
         for col in self.rocks:
@@ -291,24 +646,59 @@ class Chunk(object):
                 if rock is None:
                     continue
                 rock.draw(self.tiled_surface, rendermode='tiles')
-                rock.draw(self.pixel_surface, rendermode='pixels')
         for col in self.trees:
             for tree in col:
                 if tree is None:
                     continue
                 tree.draw(self.tiled_surface, rendermode='tiles')
-                tree.draw(self.pixel_surface, rendermode='pixels')
+        self.render_pixels()
+
+    def render_constructions(self):
+        """Shade the tiles covered by constructions, in one batch of blits."""
+        if not self.occupancy.any():
+            return
+        shades = self.constructions.shades(numpy.unique(self.occupancy))
+        width, height = images.get_terrain().get_size()
+        built = numpy.argwhere(self.occupancy)
+        alphas = shades[self.occupancy[built[:, 0], built[:, 1]]]
+        self.tiled_surface.blits(
+            [(shade(alpha), (u * width, v * height))
+             for (u, v), alpha in zip(built.tolist(), alphas.tolist())],
+            doreturn=False)
+
+    def render_pixels(self):
+        """Render the chunk onto its single pixel per tile surface.
+
+        This is much cheaper than rendering the tiles, so new chunks do it
+        straight away to have something to show in the minimap, and to
+        scale up as a placeholder until their tiles are rendered.
+
+        """
+        for col in self.tiles:
+            for tile in col:
+                tile.draw(self.pixel_surface, rendermode='pixels')
+        for resources in (self.rocks, self.trees):
+            for col in resources:
+                for resource in col:
+                    if resource is not None:
+                        resource.draw(self.pixel_surface, rendermode='pixels')
 
     def draw(self, surface, xoffset=0, yoffset=0, rendermode='tiles'):
-        """Draw the chunk onto the given surface."""
-        if self.dirty:
-            self.dirty = False
-            self.render()
+        """Draw the chunk onto the given surface.
 
+        Dirty chunks are drawn as they were last rendered, since rendering
+        is left to the map's render scheduler.
+
+        """
         if rendermode == 'tiles':
             pos = (self.x * self.tiled_surface.get_width() + xoffset,
                    self.y * self.tiled_surface.get_height() + yoffset)
-            surface.blit(self.tiled_surface, pos)
+            if self.version == 0:
+                size = self.tiled_surface.get_size()
+                surface.blit(pygame.transform.scale(self.pixel_surface, size),
+                             pos)
+            else:
+                surface.blit(self.tiled_surface, pos)
         elif rendermode == 'pixels':
             pos = (self.x * 16 + xoffset, self.y * 16 + yoffset)
             surface.blit(self.pixel_surface, pos)
@@ -317,6 +707,53 @@ class Chunk(object):
                             rendermode)
 
 
+class CoarseChunk(object):
+
+    """A low detail stand-in for a chunk, for the minimap.
+
+    Coarse chunks only have a surface with a pixel for each tile, made
+    from terrain sampled with `sample_terrain_coarse`. They don't have any
+    tiles, so they are replaced by full chunks when they are needed for
+    anything else.
+
+    """
+
+    def __init__(self, x, y, height_gen, rock_gen, tree_gen):
+        """Generate a coarse chunk.
+
+        :param x: The x position of this chunk.
+        :param y: The y position of this chunk.
+        :param height_gen: A NoiseGenerator to generate tile heights.
+        :param rock_gen: A NoiseGenerator to generate rocks.
+        :param tree_gen: A NoiseGenerator to generate trees.
+
+        """
+        self.x = x
+        self.y = y
+        terrain = sample_terrain_coarse(16 * x, 16 * y, 16, 16, height_gen,
+                                        rock_gen, tree_gen,
+                                        step=conf.COARSE_STEP)
+        self.pixel_surface = pygame.surfarray.make_surface(
+            pixel_colours(*terrain))
+        if pygame.display.get_surface() is not None:
+            self.pixel_surface = self.pixel_surface.convert()
+
+    def __repr__(self):
+        return '<CoarseChunk x=%s y=%s>' % (self.x, self.y)
+
+    def draw(self, surface, xoffset=0, yoffset=0, rendermode='pixels'):
+        """Draw the chunk onto the given surface.
+
+        Coarse chunks can only be drawn in `pixels` mode.
+
+        """
+        if rendermode != 'pixels':
+            raise Exception('Unrecognised render mode for CoarseChunk: %s' %
+                            rendermode)
+        surface.blit(self.pixel_surface, (self.x * 16 + xoffset,
+                                          self.y * 16 + yoffset))
+
+
 class Map(object):
 
     """A container for a set of chunks.
@@ -325,7 +762,7 @@ class Map(object):
 
     """
 
-    def __init__(self, seed, x=10, y=10, generate=True):
+    def __init__(self, seed, x=10, y=10, generate=True, store=None):
         """Initialize a Map.
 
         This creates a map with a given seed, and generates an
@@ -334,16 +771,53 @@ class Map(object):
         :param seed: Seed to use when creating noise generators.
         :param x: How many columns of chunks to create. Default 10.
         :param y: How many rows of chunks to create. Default 10.
+        :param store: A ChunkStore of pre-generated chunks to load
+        chunks from instead of generating them, if they are in it.
 
         """
+        self.seed = seed
+        self.store = store
         self._make_generators(seed)
         self.chunks = {}
+        # Chunks which are only shown on the minimap, keyed by position.
+        # There is never a coarse chunk where there is a full one.
+        self.coarse_chunks = {}
+        self.connectivity = connectivity.ConnectivityIndex()
         self.render_set = set()
-        self.stockpiles = []
+        self._streamed_around = None
+        self.mipmaps = mipmap.MipmapCache(self)
+        self.renderer = scheduler.RenderScheduler(self)
+        self.memory = memory.MemoryTracker(self)
+        self.constructions = ConstructionTable()
+        # The SaveGame this map was loaded from, which has the saved
+        # changes to chunks which haven't been loaded yet.
+        self.savegame = None
         self.actors = pygame.sprite.Group()
-        self.actors.add(Villager())
+        self.population = population.Population()
+        self.add_villager(Villager())
+        self.actor_scheduler = lod.ActorScheduler(self)
         if generate:
             self.chunks = self._generate_initial_chunks(x, y)
+            for chunk in self.chunks.values():
+                self.connectivity.add_chunk(chunk)
+
+    def add_villager(self, villager):
+        """Add a villager to the map's actors and population.
+
+        :param villager: The villager to add.
+
+        """
+        self.actors.add(villager)
+        self.population.add(villager)
+
+    def remove_villager(self, villager):
+        """Remove a villager from the map's actors and population.
+
+        :param villager: The villager to remove.
+
+        """
+        self.actors.remove(villager)
+        self.population.remove(villager)
 
     def _make_generators(self, seed):
         """Make the noise generators for this map.
@@ -351,11 +825,44 @@ class Map(object):
         :param seed: The seed to use when creating the noise generators.
 
         """
-        random.seed(seed)
-        seeds = [random.random() for _ in range(0, 3)]
-        self.height_noise = NoiseGenerator(seeds[0])
-        self.rock_noise = NoiseGenerator(seeds[1])
-        self.tree_noise = NoiseGenerator(seeds[2])
+        generators = make_generators(seed)
+        self.height_noise, self.rock_noise, self.tree_noise = generators
+
+    def _make_chunk(self, chunk_x, chunk_y):
+        """Create the chunk at a given chunk position.
+
+        The chunk is loaded from the chunk store if the map has one and
+        the chunk is in it, otherwise it is generated.
+
+        :param chunk_x: The x position of the chunk.
+        :param chunk_y: The y position of the chunk.
+
+        """
+        return Chunk(chunk_x, chunk_y,
+                     self.height_noise,
+                     self.rock_noise,
+                     self.tree_noise,
+                     data=self.chunk_data(chunk_x, chunk_y),
+                     constructions=self.constructions)
+
+    def chunk_data(self, chunk_x, chunk_y):
+        """Return the generated content of a chunk, without making it.
+
+        The content is loaded from the chunk store if the map has one and
+        the chunk is in it, otherwise it is generated. Changes made to the
+        chunk since it was generated aren't included.
+
+        :param chunk_x: The x position of the chunk.
+        :param chunk_y: The y position of the chunk.
+
+        """
+        data = None
+        if self.store is not None:
+            data = self.store.load(chunk_x, chunk_y)
+        if data is None:
+            data = generate_chunk_data(chunk_x, chunk_y, self.height_noise,
+                                       self.rock_noise, self.tree_noise)
+        return data
 
     def _generate_initial_chunks(self, x, y):
         """Generate some initial chunks for the map.
@@ -367,13 +874,26 @@ class Map(object):
         chunks = {}
         for chunk_x in range(-x//2, x//2):
             for chunk_y in range(-x//2, y//2):
-                chunks[(chunk_x, chunk_y)] = Chunk(
-                    chunk_x, chunk_y,
-                    self.height_noise,
-                    self.rock_noise,
-                    self.tree_noise)
+                chunks[(chunk_x, chunk_y)] = self._make_chunk(
+                    chunk_x, chunk_y)
         return chunks
 
+    def _chunk_position(self, x, y):
+        """Return the position of the chunk at a given pixel coordinate.
+
+        :param x: The x coordinate.
+        :param y: The y coordinate.
+
+        """
+        chunk_x = int(x / 16 / 16)
+        chunk_y = int(y / 16 / 16)
+
+        if x < 0 and (x / 16) % 16 != 0:
+            chunk_x -= 1
+        if y < 0 and (y / 16) % 16 != 0:
+            chunk_y -= 1
+        return chunk_x, chunk_y
+
     def _get_chunk_at(self, x, y):
         """Return the chunk at a given x and y coordinate.
 
@@ -386,22 +906,47 @@ class Map(object):
         :param y: The y coordinate.
 
         """
-        chunk_x = int(x / 16 / 16)
-        chunk_y = int(y / 16 / 16)
+        position = self._chunk_position(x, y)
+        if position not in self.chunks:
+            self._load_chunk(*position)
+        return self.chunks[position]
 
-        if x < 0 and (x / 16) % 16 != 0:
-            chunk_x -= 1
-        if y < 0 and (y / 16) % 16 != 0:
-            chunk_y -= 1
+    def _load_chunk(self, chunk_x, chunk_y):
+        """Create the chunk at a given chunk position and add it to the map.
+
+        :param chunk_x: The x position of the chunk.
+        :param chunk_y: The y position of the chunk.
+
+        """
+        with profiling.span('generate'):
+            chunk = self._make_chunk(chunk_x, chunk_y)
+            if self.savegame is not None:
+                self.savegame.restore_chunk(self, chunk)
+            self.chunks[(chunk_x, chunk_y)] = chunk
+            self.coarse_chunks.pop((chunk_x, chunk_y), None)
+        with profiling.span('connectivity'):
+            self.connectivity.add_chunk(chunk)
+        profiling.count('chunks_generated')
+
+    def get_chunk(self, chunk_x, chunk_y, keep=True):
+        """Get the chunk at a given chunk position.
+
+        :param chunk_x: The x position of the chunk.
+        :param chunk_y: The y position of the chunk.
+        :param keep: Whether to add the chunk to the map if it has to be
+        generated. If this is False, the chunk isn't kept once the caller
+        is done with it, unless it has saved changes to restore.
 
-        if not (chunk_x, chunk_y) in self.chunks:
-            self.chunks[(chunk_x, chunk_y)] = Chunk(
-                chunk_x, chunk_y,
-                self.height_noise,
-                self.rock_noise,
-                self.tree_noise
-            )
-        return self.chunks[(chunk_x, chunk_y)]
+        """
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            saved = (self.savegame is not None and
+                     (chunk_x, chunk_y) in self.savegame)
+            if not keep and not saved:
+                return self._make_chunk(chunk_x, chunk_y)
+            self._load_chunk(chunk_x, chunk_y)
+            chunk = self.chunks[(chunk_x, chunk_y)]
+        return chunk
 
     def get_tile(self, x, y):
         """Get the tile at a given x and y coordinate.
@@ -416,55 +961,276 @@ class Map(object):
         tile_y = int((y / 16) % 16)
         return chunk.get_tile(tile_x, tile_y)
 
-    def update(self, surface, xoffset, yoffset):
+    def find_tile(self, x, y):
+        """Get the tile at a given x and y coordinate if it is loaded.
+
+        Unlike `get_tile`, this never generates a chunk, so it is cheap
+        enough to use for things like hovering. Returns None if the tile's
+        chunk isn't loaded.
+
+        :param x: The x coordinate.
+        :param y: The y coordinate.
+
+        """
+        chunk = self.chunks.get(self._chunk_position(x, y))
+        if chunk is None:
+            return None
+        return chunk.get_tile(int((x / 16) % 16), int((y / 16) % 16))
+
+    def construction_at(self, x, y):
+        """Get the construction at a given x and y coordinate.
+
+        Returns None if there is nothing built there.
+
+        :param x: The x coordinate.
+        :param y: The y coordinate.
+
+        """
+        chunk = self._get_chunk_at(x, y)
+        return chunk.construction_at(int((x / 16) % 16), int((y / 16) % 16))
+
+    def is_clear(self, x0, y0, x1, y1):
+        """Return True if there is nothing built in a rectangle of tiles.
+
+        :param x0: The x position of the top left tile.
+        :param y0: The y position of the top left tile.
+        :param x1: The x position of the bottom right tile.
+        :param y1: The y position of the bottom right tile.
+
+        """
+        for chunk_x in range(x0 // 16, x1 // 16 + 1):
+            for chunk_y in range(y0 // 16, y1 // 16 + 1):
+                chunk = self.get_chunk(chunk_x, chunk_y)
+                u0 = max(x0 - 16 * chunk_x, 0)
+                v0 = max(y0 - 16 * chunk_y, 0)
+                u1 = min(x1 - 16 * chunk_x, 15)
+                v1 = min(y1 - 16 * chunk_y, 15)
+                if chunk.occupancy[u0:u1 + 1, v0:v1 + 1].any():
+                    return False
+        return True
+
+    def place(self, construction):
+        """Build a construction on the tiles it covers.
+
+        Raises ValueError if any of the tiles already has something built
+        on it.
+
+        :param construction: The construction to place.
+
+        """
+        for tile in construction.tiles:
+            if tile.chunk.occupancy[tile.x % 16, tile.y % 16]:
+                raise ValueError('%r is already built on' % tile)
+        construction_id = self.constructions.add(construction)
+        for tile in construction.tiles:
+            tile.chunk.occupancy[tile.x % 16, tile.y % 16] = construction_id
+            tile.chunk.dirty = True
+        return construction_id
+
+    def update(self, surface, xoffset, yoffset, zoom=0, focus=None):
         """Update the Map status for the current frame.
 
         This function loads and unloads chunks in order to have only
         a relevant portion of the map rendering at any given time. If
-        a required chunk does not exist, it is generated.
+        a required chunk does not exist, it is generated. Chunks around
+        the visible ones are streamed in a few at a time, and dirty chunks
+        are rendered within the frame's render budget.
 
         :param surface: The surface to draw the map on.
         :param xoffset: The x coordinate (pixel) in the top left of the
         display surface.
         :param yoffset: The y coordinate (pixel) in the top left of the
         display surface.
+        :param zoom: The zoom level the map is viewed at. When zoomed
+        out, the map is drawn from mip tiles rather than chunks, so no
+        chunks are loaded for rendering.
+        :param focus: The (x, y) pixel position on the map to render dirty
+        chunks around first, such as the position of the cursor. Defaults
+        to the centre of the viewport.
 
         """
         chunk_size = 16*16
-        x_range = range(-1 * xoffset,
-                        -1 * xoffset + surface.get_width() + chunk_size,
-                        chunk_size)
-        y_range = range(-1 * yoffset,
-                        -1 * yoffset + surface.get_height() + chunk_size,
-                        chunk_size)
+        scale = 1.0 / (1 << zoom)
         self.render_set = set()
-        for x in x_range:
-            for y in y_range:
-                chunk = self._get_chunk_at(x, y)
-                self.render_set.add(chunk)
+        if zoom == 0:
+            x_range = range(-1 * xoffset,
+                            -1 * xoffset + surface.get_width() + chunk_size,
+                            chunk_size)
+            y_range = range(-1 * yoffset,
+                            -1 * yoffset + surface.get_height() + chunk_size,
+                            chunk_size)
+            for x in x_range:
+                for y in y_range:
+                    chunk = self._get_chunk_at(x, y)
+                    self.render_set.add(chunk)
+
+        centre_x = (-xoffset + surface.get_width() / scale / 2) / chunk_size
+        centre_y = (-yoffset + surface.get_height() / scale / 2) / chunk_size
+        self._stream_chunks(centre_x, centre_y)
+        if len(self.chunks) > conf.MAX_LOADED_CHUNKS:
+            self._unload_chunks(centre_x, centre_y)
+
+        if focus is None:
+            self.renderer.run(centre_x, centre_y)
+        else:
+            self.renderer.run(float(focus[0]) / chunk_size,
+                              float(focus[1]) / chunk_size)
+
+        view_x = -xoffset // chunk_size
+        view_y = -yoffset // chunk_size
+        bounds = (int(view_x) - 1, int(view_y) - 1,
+                  int((-xoffset + surface.get_width() / scale) //
+                      chunk_size) + 1,
+                  int((-yoffset + surface.get_height() / scale) //
+                      chunk_size) + 1)
+        with profiling.span('actors'):
+            self.actor_scheduler.run(xoffset, yoffset, scale, bounds)
+
+        if profiling.enabled:
+            profiling.gauge('loaded_chunks', len(self.chunks))
+            profiling.gauge('surface_bytes', self.surface_bytes())
+            with profiling.span('memory'):
+                self.memory.update()
+            profiling.gauge('memory_bytes', self.memory.total())
+
+    def memory_report(self):
+        """Measure the memory used by the map, by category.
+
+        Returns a dictionary in the form returned by
+        `township.memory.MemoryTracker.report`, with peaks covering every
+        measurement since the map was created. Measurements are also
+        taken every frame while profiling is enabled.
+
+        """
+        return self.memory.update()
 
-        self.actors.update(xoffset, yoffset)
+    def surface_bytes(self):
+        """Return the number of bytes of pixels in full and coarse chunks."""
+        total = 0
+        for chunk in self.chunks.values():
+            for surface in (chunk.tiled_surface, chunk.pixel_surface):
+                total += memory.surface_bytes(surface)
+        for chunk in self.coarse_chunks.values():
+            total += memory.surface_bytes(chunk.pixel_surface)
+        return total
 
-    def draw(self, surface, xoffset, yoffset, minimap=None):
+    def _missing(self, around, radius, centre_x, centre_y, skip):
+        """Return the positions within a radius with no chunk, nearest first.
+
+        Positions in `skip` are left out too.
+
+        """
+        missing = [(x, y)
+                   for x in range(around[0] - radius, around[0] + radius + 1)
+                   for y in range(around[1] - radius, around[1] + radius + 1)
+                   if (x, y) not in self.chunks and (x, y) not in skip]
+        order = numpy.argsort(vectors.distances_squared(
+            missing, (centre_x, centre_y)), kind='stable')
+        return [missing[i] for i in order.tolist()]
+
+    def _stream_chunks(self, centre_x, centre_y):
+        """Load some of the missing chunks around a given position.
+
+        At most `conf.STREAM_CHUNKS_PER_FRAME` chunks are loaded per call,
+        nearest first, so the area around the viewport fills in over a
+        number of frames rather than all at once. Once every chunk within
+        `conf.STREAM_RADIUS` is loaded, coarse chunks are made for the rest
+        of the area shown on the minimap in the same way.
+
+        :param centre_x: The x position to load chunks around, in chunks.
+        :param centre_y: The y position to load chunks around, in chunks.
+
+        """
+        around = (int(math.floor(centre_x)), int(math.floor(centre_y)))
+        if around == self._streamed_around:
+            return
+
+        # Coarse chunks near the view are replaced by full ones, which
+        # drops the coarse chunk when it loads.
+        missing = self._missing(around, conf.STREAM_RADIUS,
+                                centre_x, centre_y, ())
+        for position in missing[:conf.STREAM_CHUNKS_PER_FRAME]:
+            self._load_chunk(*position)
+        if len(missing) > conf.STREAM_CHUNKS_PER_FRAME:
+            return
+
+        radius = conf.MINIMAP_RADIUS
+        with profiling.span('coarse'):
+            missing = self._missing(around, radius, centre_x, centre_y,
+                                    self.coarse_chunks)
+            for x, y in missing[:conf.COARSE_CHUNKS_PER_FRAME]:
+                self.coarse_chunks[(x, y)] = CoarseChunk(
+                    x, y, self.height_noise, self.rock_noise, self.tree_noise)
+        if len(missing) <= conf.COARSE_CHUNKS_PER_FRAME:
+            self._streamed_around = around
+            # Forget coarse chunks which have gone well off the minimap
+            for x, y in list(self.coarse_chunks):
+                if max(abs(x - around[0]), abs(y - around[1])) > radius + 2:
+                    del self.coarse_chunks[(x, y)]
+
+    def _unload_chunks(self, centre_x, centre_y):
+        """Unload the chunks furthest from a given position.
+
+        Chunks are unloaded until only three quarters of the maximum
+        number of loaded chunks remain, so that this doesn't need to
+        happen every frame. Chunks which are being rendered or are
+        pinned are never unloaded. Unloaded chunks are regenerated
+        identically if they are needed again.
+
+        :param centre_x: The x position to keep chunks around, in chunks.
+        :param centre_y: The y position to keep chunks around, in chunks.
+
+        """
+        target = conf.MAX_LOADED_CHUNKS * 3 // 4
+        positions = list(self.chunks)
+        distances = vectors.distances_squared(positions, (centre_x, centre_y))
+        for i in numpy.argsort(-distances, kind='stable').tolist():
+            position = positions[i]
+            if len(self.chunks) <= target:
+                break
+            chunk = self.chunks[position]
+            if chunk in self.render_set or chunk.is_pinned():
+                continue
+            del self.chunks[position]
+            self.connectivity.remove_chunk(*position)
+            self._streamed_around = None
+
+    def draw(self, surface, xoffset, yoffset, minimap=None, zoom=0):
         """Draw the map onto a surface with a given offset.
 
         :param surface: The surface to draw on.
         :param xoffset: The x coordinate to draw in the top left.
         :param yoffset: The y coordinate to draw in the top left.
         :param minimap: Surface to render a minimap on.
+        :param zoom: The zoom level to draw the map at. The map is drawn
+        at a scale of 1 / 2**zoom.
 
         """
         if minimap is not None:
             minimap.fill((0, 0, 0))
-        for chunk in self.render_set:
-            chunk.draw(surface, xoffset, yoffset, 'tiles')
-        self.actors.draw(surface)
+        with profiling.span('draw'):
+            if zoom == 0:
+                for chunk in self.render_set:
+                    chunk.draw(surface, xoffset, yoffset, 'tiles')
+            else:
+                self.mipmaps.draw(surface, xoffset, yoffset, zoom)
+            self.actor_scheduler.visible.draw(surface)
+        profiling.count('blits', len(self.render_set) +
+                        len(self.actor_scheduler.visible))
 
         if minimap is not None:
             minimap_x_offset = minimap.get_width() / 2
             minimap_y_offset = minimap.get_height() / 2
-            for chunk in self.chunks.values():
-                chunk.draw(minimap,
-                           minimap_x_offset + (xoffset / 16),
-                           minimap_y_offset + (yoffset / 16),
-                           'pixels')
+            with profiling.span('minimap'):
+                for chunk in self.coarse_chunks.values():
+                    chunk.draw(minimap,
+                               minimap_x_offset + (xoffset / 16),
+                               minimap_y_offset + (yoffset / 16),
+                               'pixels')
+                for chunk in self.chunks.values():
+                    chunk.draw(minimap,
+                               minimap_x_offset + (xoffset / 16),
+                               minimap_y_offset + (yoffset / 16),
+                               'pixels')
+            profiling.count('blits',
+                            len(self.chunks) + len(self.coarse_chunks))
@@ -0,0 +1,174 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Accounting of the memory used by a map.
+
+Memory is counted by category:
+
+- ``surfaces.tiled``, ``surfaces.pixel`` and ``surfaces.mipmap``: the
+  pixels of chunk surfaces and cached mip tiles.
+- ``surfaces.coarse``: the pixels of the coarse chunks made for the
+  minimap and distant mip tiles.
+- ``tiles`` and ``resources``: the Python objects making up chunks.
+- ``actors``: actor objects, their images and the population tables.
+- ``assets``: the decoded terrain and resource images.
+
+Pixel counts are exact, but Python objects are estimated from the size
+of a sample object from each chunk, since measuring every tile would be
+far too slow to do regularly.
+
+"""
+
+
+import sys
+
+from township import images
+
+
+CATEGORIES = ['surfaces.tiled', 'surfaces.pixel', 'surfaces.mipmap',
+              'surfaces.coarse', 'tiles', 'resources', 'actors', 'assets']
+
+
+def surface_bytes(surface):
+    """Return the number of bytes of pixels in a surface."""
+    return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+
+def object_bytes(obj):
+    """Return the size of an object, including its attribute dictionary."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def tile_bytes(tile):
+    """Estimate the memory used by a tile, excluding shared images."""
+    return (object_bytes(tile) + sys.getsizeof(tile.height) +
+            sys.getsizeof(tile.colour) +
+            sum(sys.getsizeof(channel) for channel in tile.colour))
+
+
+def chunk_object_bytes(chunk):
+    """Estimate the memory used by the tiles and resources of a chunk.
+
+    Returns a tuple of (tile bytes, resource bytes).
+
+    """
+    tiles = 16 * tile_bytes(chunk.tiles[0][0])
+    tiles += sum(sys.getsizeof(col) for col in chunk.tiles)
+    tiles *= 16
+    tiles += sys.getsizeof(chunk.tiles) + sys.getsizeof(chunk.occupancy)
+
+    resources = 0
+    for grid in (chunk.rocks, chunk.trees):
+        resources += sys.getsizeof(grid)
+        count = 0
+        sample = None
+        for col in grid:
+            resources += sys.getsizeof(col)
+            for resource in col:
+                if resource is not None:
+                    count += 1
+                    sample = resource
+        if sample is not None:
+            resources += count * object_bytes(sample)
+    return tiles, resources
+
+
+def asset_bytes():
+    """Return the number of bytes of decoded images in the image caches."""
+    total = 0
+    seen = set()
+    for cache in (images.terrain, images.map_resources):
+        for surface in cache.values():
+            # Images from the atlas are subsurfaces sharing its pixels
+            parent = surface.get_parent() or surface
+            if id(parent) not in seen:
+                seen.add(id(parent))
+                total += surface_bytes(parent)
+    return total
+
+
+class MemoryTracker(object):
+
+    """Tracks the current and peak memory use of a map."""
+
+    def __init__(self, game_map):
+        """Initialise the tracker.
+
+        :param game_map: The map to track the memory use of.
+
+        """
+        self.map = game_map
+        self.current = dict((category, 0) for category in CATEGORIES)
+        self.peak = dict(self.current)
+        self.peak_total = 0
+        # Object sizes of chunks, keyed by chunk, since they only change
+        # when a chunk is replaced.
+        self._chunk_objects = {}
+
+    def measure(self):
+        """Return the number of bytes currently used in each category."""
+        usage = dict((category, 0) for category in CATEGORIES)
+        objects = {}
+        for chunk in self.map.chunks.values():
+            usage['surfaces.tiled'] += surface_bytes(chunk.tiled_surface)
+            usage['surfaces.pixel'] += surface_bytes(chunk.pixel_surface)
+            sizes = self._chunk_objects.get(chunk)
+            if sizes is None:
+                sizes = chunk_object_bytes(chunk)
+            objects[chunk] = sizes
+            usage['tiles'] += sizes[0]
+            usage['resources'] += sizes[1]
+        self._chunk_objects = objects
+        for chunk in self.map.coarse_chunks.values():
+            usage['surfaces.coarse'] += surface_bytes(chunk.pixel_surface)
+
+        for surface in self.map.mipmaps.tiles.values():
+            usage['surfaces.mipmap'] += surface_bytes(surface)
+        for actor in self.map.actors:
+            usage['actors'] += object_bytes(actor) + surface_bytes(actor.image)
+        usage['actors'] += self.map.population.nbytes()
+        usage['assets'] = asset_bytes()
+        return usage
+
+    def update(self):
+        """Measure the current memory use, updating the peaks."""
+        self.current = self.measure()
+        for category, value in self.current.items():
+            self.peak[category] = max(self.peak[category], value)
+        self.peak_total = max(self.peak_total, self.total())
+        return self.report()
+
+    def total(self):
+        """Return the total bytes used as of the last update."""
+        return sum(self.current.values())
+
+    def report(self):
+        """Return the results of the last update.
+
+        The result is a dictionary with `current` and `peak` usage by
+        category, along with `total` and `peak_total` in bytes. The peak
+        total is the highest total seen, which can be less than the sum
+        of the peaks of the categories.
+
+        """
+        return {
+            'current': dict(self.current),
+            'peak': dict(self.peak),
+            'total': self.total(),
+            'peak_total': self.peak_total,
+        }
@@ -0,0 +1,234 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Cached, downscaled renders of the map for zoomed out views.
+
+The map is covered by a quadtree of mip tiles. A tile at level 0 is a
+single chunk's tiled surface, or for chunks which aren't loaded, the
+colours of its tiles scaled up, so that no chunks are generated just to
+be thrown away again. A tile at level `n` has the same size, and
+is made from the four level `n - 1` tiles it covers, each scaled to half
+size. This means the number of tiles needed to fill the screen is the
+same at every zoom level.
+
+Tiles are built the first time they are drawn and kept in a cache of
+limited size, least recently used first out. Tiles are rebuilt when a
+chunk they cover is rendered again. Only `conf.MIPMAP_BUILDS_PER_FRAME`
+tiles are built per frame, counting the tiles built along the way to
+build another, so a tile far from any cached ones can take a few frames
+to appear.
+
+From `conf.COARSE_ZOOM_LEVEL` up, tiles which don't cover any loaded
+chunks are built straight from coarsely sampled terrain instead, with a
+pixel for each map tile scaled up to the tile size, since generating and
+rendering every chunk they cover in full would take far too long. These
+are replaced by tiles built in the usual way once a chunk they cover is
+loaded.
+
+"""
+
+
+import collections
+
+import pygame
+
+from township import conf
+from township import map as township_map
+from township import profiling
+
+
+class MipmapCache(object):
+
+    """A cache of mip tiles for a map."""
+
+    def __init__(self, game_map, size=None):
+        """Initialise the cache.
+
+        :param game_map: The map to render mip tiles of.
+        :param size: The maximum number of tiles to keep. Defaults to
+        `conf.MIPMAP_CACHE_SIZE`.
+
+        """
+        self.map = game_map
+        self.size = size or conf.MIPMAP_CACHE_SIZE
+        self.tiles = collections.OrderedDict()
+        # The chunk versions used to build each level 1 tile, keyed
+        # by chunk position.
+        self._chunk_versions = {}
+        # The keys of the cached tiles built from coarse terrain.
+        self._coarse = set()
+        # The number of tiles which can still be built this frame, or
+        # None outside of `draw` for no limit.
+        self._builds_left = None
+
+    def invalidate_chunk(self, chunk_x, chunk_y):
+        """Discard every cached tile covering a given chunk.
+
+        :param chunk_x: The x position of the chunk.
+        :param chunk_y: The y position of the chunk.
+
+        """
+        self._chunk_versions.pop((chunk_x, chunk_y), None)
+        for level in range(0, conf.MAX_ZOOM_LEVEL + 1):
+            key = (level, chunk_x >> level, chunk_y >> level)
+            self.tiles.pop(key, None)
+            self._coarse.discard(key)
+
+    def update(self):
+        """Discard tiles built from chunks which have been re-rendered."""
+        for position, chunk in self.map.chunks.items():
+            built = self._chunk_versions.get(position)
+            if built is not None and built != chunk.version:
+                self.invalidate_chunk(*position)
+            elif built is None and self._coarse:
+                # Chunks loaded since a coarse tile covering them was built
+                for level in range(conf.COARSE_ZOOM_LEVEL,
+                                   conf.MAX_ZOOM_LEVEL + 1):
+                    key = (level, position[0] >> level, position[1] >> level)
+                    if key in self._coarse:
+                        self._coarse.discard(key)
+                        self.tiles.pop(key, None)
+
+    def get(self, level, x, y, build=True):
+        """Return the surface of a mip tile, building it if needed.
+
+        :param level: The zoom level of the tile.
+        :param x: The x position of the tile, in tiles of this level.
+        :param y: The y position of the tile, in tiles of this level.
+        :param build: Whether to build the tile if it isn't cached. If
+        this is False, or this frame's builds are used up, None is
+        returned for tiles which aren't cached.
+
+        """
+        chunk = self.map.chunks.get((x, y)) if level == 0 else None
+        if chunk is not None:
+            if chunk.dirty:
+                chunk.dirty = False
+                chunk.render()
+            recorded = self._chunk_versions.get((x, y), chunk.version)
+            if recorded != chunk.version:
+                # Tiles built from an older look of the chunk are stale
+                self.invalidate_chunk(x, y)
+            self._chunk_versions[(x, y)] = chunk.version
+            return chunk.tiled_surface
+
+        key = (level, x, y)
+        surface = self.tiles.get(key)
+        if surface is not None:
+            self.tiles.move_to_end(key)
+            return surface
+        if not build or (self._builds_left is not None and
+                         self._builds_left <= 0):
+            return None
+
+        with profiling.span('mipmap'):
+            if level == 0:
+                # Version 0 is never rendered, so the tiles built from
+                # this are replaced once the chunk is loaded and rendered.
+                self._chunk_versions[(x, y)] = 0
+                surface = self._build_terrain(x, y)
+            elif level >= conf.COARSE_ZOOM_LEVEL and not self._covers_loaded(
+                    level, x, y):
+                surface = self._build_coarse(level, x, y)
+                self._coarse.add(key)
+            else:
+                surface = self._build(level, x, y)
+        if surface is None:
+            # A tile this one is made from couldn't be built this frame
+            return None
+        if self._builds_left is not None:
+            self._builds_left -= 1
+        profiling.count('mip_tiles_built')
+        self.tiles[key] = surface
+        while len(self.tiles) > self.size:
+            self._coarse.discard(self.tiles.popitem(last=False)[0])
+        return surface
+
+    def _covers_loaded(self, level, x, y):
+        return any(chunk_x >> level == x and chunk_y >> level == y
+                   for chunk_x, chunk_y in self.map.chunks)
+
+    def _build_coarse(self, level, x, y):
+        size = 16 << level
+        terrain = township_map.sample_terrain_coarse(
+            x * size, y * size, size, size, self.map.height_noise,
+            self.map.rock_noise, self.map.tree_noise, step=1 << (level - 1),
+            octaves=conf.COARSE_MIP_OCTAVES)
+        pixels = pygame.surfarray.make_surface(
+            township_map.pixel_colours(*terrain))
+        surface = township_map.opaque_surface((16 * 16, 16 * 16))
+        pygame.transform.scale(pixels, surface.get_size(), surface)
+        return surface
+
+    def _build_terrain(self, x, y):
+        terrain = township_map.sample_terrain(
+            16 * x, 16 * y, 16, 16, self.map.height_noise,
+            self.map.rock_noise, self.map.tree_noise)
+        pixels = pygame.surfarray.make_surface(
+            township_map.pixel_colours(*terrain))
+        surface = township_map.opaque_surface((16 * 16, 16 * 16))
+        pygame.transform.scale(pixels, surface.get_size(), surface)
+        return surface
+
+    def _build(self, level, x, y):
+        children = [(i, j) for i in range(0, 2) for j in range(0, 2)]
+        surface = None
+        for i, j in children:
+            child = self.get(level - 1, 2 * x + i, 2 * y + j)
+            if child is None:
+                return None
+            if surface is None:
+                width, height = child.get_size()
+                surface = township_map.opaque_surface((width, height))
+                half = (width // 2, height // 2)
+            surface.blit(pygame.transform.smoothscale(child, half),
+                         (i * half[0], j * half[1]))
+        return surface
+
+    def draw(self, surface, xoffset, yoffset, level):
+        """Draw the mip tiles covering a surface at a given zoom level.
+
+        :param surface: The surface to draw on.
+        :param xoffset: The x offset of the view, in full size pixels.
+        :param yoffset: The y offset of the view, in full size pixels.
+        :param level: The zoom level to draw at. The map is drawn at a
+        scale of 1 / 2**level.
+
+        """
+        self.update()
+        tile_size = 16 * 16
+        world_size = tile_size << level
+        scale = 1.0 / (1 << level)
+        first_x = int(-xoffset // world_size)
+        first_y = int(-yoffset // world_size)
+        last_x = int((-xoffset + surface.get_width() / scale) // world_size)
+        last_y = int((-yoffset + surface.get_height() / scale) // world_size)
+        # Only build a few tiles per frame, leaving the rest of the view
+        # empty until later frames build them.
+        self._builds_left = conf.MIPMAP_BUILDS_PER_FRAME
+        for x in range(first_x, last_x + 1):
+            for y in range(first_y, last_y + 1):
+                tile = self.get(level, x, y)
+                position = (int(x * tile_size + xoffset * scale),
+                            int(y * tile_size + yoffset * scale))
+                if tile is None:
+                    surface.fill((0, 0, 0), (position, (tile_size,
+                                                         tile_size)))
+                else:
+                    surface.blit(tile, position)
+        self._builds_left = None
+        profiling.count('blits', (last_x - first_x + 1) *
+                        (last_y - first_y + 1))
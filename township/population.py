@@ -0,0 +1,238 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Stats and relationships of a population of villagers.
+
+Rather than each villager keeping a dictionary of stats and a dictionary
+of relationships with other villagers, a population keeps them in arrays
+indexed by each villager's index in the population. Stats are a table
+with a row per villager and a column per stat. Relationships are sparse,
+only stored for pairs of villagers which have one, as a sorted array of
+(from, to) keys and an array of affinities. This keeps memory linear in
+the number of relationships rather than quadratic in the number of
+villagers, and lets queries and updates work on whole arrays at once.
+
+"""
+
+
+import numpy
+
+
+# The stats of a villager, in the order of the stats table's columns
+STATS = ['strength', 'dexterity', 'constitution', 'intelligence', 'wisdom',
+         'charisma', 'speed']
+
+
+def _keys(sources, targets):
+    return ((numpy.asarray(sources, dtype=numpy.int64) << 32) |
+            numpy.asarray(targets, dtype=numpy.int64))
+
+
+class Population(object):
+
+    """The stats and relationships of a group of villagers."""
+
+    def __init__(self, capacity=16):
+        """Initialise an empty population.
+
+        :param capacity: The number of villagers to make room for. The
+        tables grow as needed beyond this.
+
+        """
+        self.villagers = []
+        self.stats = numpy.zeros((capacity, len(STATS)), dtype=numpy.float32)
+        # Indices of removed villagers, to be reused
+        self._free = []
+        # Relationship keys, sorted, with the affinity of each
+        self._keys = numpy.zeros(0, dtype=numpy.int64)
+        self._affinity = numpy.zeros(0, dtype=numpy.float32)
+
+    def __len__(self):
+        return len(self.villagers) - len(self._free)
+
+    def add(self, villager):
+        """Add a villager to the population, returning its index.
+
+        The villager's current stats are copied into the stats table,
+        and from then on `villager.stats` reads and writes the table.
+
+        :param villager: The villager to add.
+
+        """
+        if self._free:
+            index = self._free.pop()
+            self.villagers[index] = villager
+        else:
+            index = len(self.villagers)
+            self.villagers.append(villager)
+            if index >= len(self.stats):
+                grown = numpy.zeros((2 * len(self.stats), len(STATS)),
+                                    dtype=numpy.float32)
+                grown[:len(self.stats)] = self.stats
+                self.stats = grown
+        self.stats[index] = [villager.stats[stat] for stat in STATS]
+        villager.population = self
+        villager.index = index
+        return index
+
+    def remove(self, villager):
+        """Remove a villager and all its relationships from the population.
+
+        :param villager: The villager to remove.
+
+        """
+        index = villager.index
+        villager.population = None
+        villager.index = None
+        villager.stats = self.get_stats(index)
+        sources = self._keys >> 32
+        targets = self._keys & 0xffffffff
+        keep = (sources != index) & (targets != index)
+        self._keys = self._keys[keep]
+        self._affinity = self._affinity[keep]
+        self.villagers[index] = None
+        self._free.append(index)
+
+    def get_stats(self, index):
+        """Return the stats of a villager as a dictionary.
+
+        :param index: The index of the villager.
+
+        """
+        return dict(zip(STATS, self.stats[index].tolist()))
+
+    def set_stats(self, index, stats):
+        """Set some or all of the stats of a villager.
+
+        :param index: The index of the villager.
+        :param stats: A dictionary of stats to set.
+
+        """
+        for stat, value in stats.items():
+            self.stats[index, STATS.index(stat)] = value
+
+    def column(self, stat):
+        """Return the column of the stats table for a stat.
+
+        The result is a view, so changing it changes every villager's stat
+        at once. Rows of removed villagers are included but meaningless.
+
+        :param stat: The name of the stat.
+
+        """
+        return self.stats[:len(self.villagers), STATS.index(stat)]
+
+    def adjust(self, sources, targets, deltas):
+        """Change the affinity of many villagers for others at once.
+
+        Relationships which don't exist yet are created, starting from an
+        affinity of 0. Repeated pairs have all their changes applied.
+
+        :param sources: The indices of the villagers whose affinity
+        changes.
+        :param targets: The indices of the villagers they feel it for.
+        :param deltas: The change in affinity for each pair, or a single
+        change for all of them.
+
+        """
+        keys = _keys(sources, targets)
+        deltas = numpy.broadcast_to(numpy.asarray(deltas, dtype=numpy.float32),
+                                    keys.shape)
+        keys, inverse = numpy.unique(keys, return_inverse=True)
+        deltas = numpy.bincount(inverse, weights=deltas,
+                                minlength=len(keys)).astype(numpy.float32)
+
+        positions = numpy.searchsorted(self._keys, keys)
+        found = positions < len(self._keys)
+        found[found] = self._keys[positions[found]] == keys[found]
+        self._affinity[positions[found]] += deltas[found]
+
+        new = ~found
+        if new.any():
+            self._keys = numpy.insert(self._keys, positions[new], keys[new])
+            self._affinity = numpy.insert(self._affinity, positions[new],
+                                          deltas[new])
+
+    def set_affinity(self, source, target, value):
+        """Set the affinity of one villager for another.
+
+        :param source: The index of the villager whose affinity to set.
+        :param target: The index of the villager it is for.
+        :param value: The new affinity.
+
+        """
+        self.adjust([source], [target], [value - self.affinity(source,
+                                                               target)])
+
+    def affinity(self, source, target):
+        """Return the affinity of one villager for another, 0 if none.
+
+        :param source: The index of the villager whose affinity to get.
+        :param target: The index of the villager it is for.
+
+        """
+        key = (source << 32) | target
+        position = numpy.searchsorted(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            return float(self._affinity[position])
+        return 0.0
+
+    def relationships(self, source):
+        """Return the villagers one villager has an affinity for.
+
+        Returns a tuple of an array of villager indices and an array of
+        the affinities for them.
+
+        :param source: The index of the villager.
+
+        """
+        start, end = numpy.searchsorted(self._keys, [source << 32,
+                                                     (source + 1) << 32])
+        return (self._keys[start:end] & 0xffffffff,
+                self._affinity[start:end])
+
+    def admirers(self, target, minimum):
+        """Return the villagers with more than an affinity for another.
+
+        For example, `admirers(chieftain.index, 0.5)` gives every villager
+        whose affinity for the chieftain is over 0.5. Returns an array of
+        villager indices.
+
+        :param target: The index of the villager they have affinity for.
+        :param minimum: The affinity to exceed.
+
+        """
+        mask = ((self._keys & 0xffffffff) == target) & (
+            self._affinity > minimum)
+        return self._keys[mask] >> 32
+
+    def decay(self, factor, threshold=0.0):
+        """Scale every affinity towards 0, dropping ones which get there.
+
+        :param factor: The factor to multiply each affinity by.
+        :param threshold: Relationships with an affinity no further from 0
+        than this afterwards are removed.
+
+        """
+        self._affinity *= factor
+        keep = numpy.abs(self._affinity) > threshold
+        if not keep.all():
+            self._keys = self._keys[keep]
+            self._affinity = self._affinity[keep]
+
+    def nbytes(self):
+        """Return the number of bytes used by the tables."""
+        return self.stats.nbytes + self._keys.nbytes + self._affinity.nbytes
@@ -0,0 +1,185 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Lightweight instrumentation of the phases of a frame.
+
+Code marks the phases it wants timed with `span`, and records counts of
+interesting things with `count` and `gauge`. At the end of every frame,
+`end_frame` moves the frame's measurements into a ring buffer, which can
+be summarised for an on-screen overlay or exported for offline analysis.
+
+Everything is a no-op while profiling is disabled, which is the default.
+
+Example:
+
+    with profiling.span('generate'):
+        chunk = generate_chunk()
+    profiling.count('chunks_generated')
+
+"""
+
+
+import collections
+import json
+import time
+
+from township import conf
+
+
+enabled = False
+
+# Measurements of the most recent frames, oldest first. Each frame is a
+# dict with the total frame time, and dicts of span times and counters.
+frames = collections.deque(maxlen=conf.PROFILE_HISTORY)
+
+_spans = {}
+_counters = {}
+_frame_start = None
+
+
+class _Span(object):
+
+    """A context manager which adds the time spent in it to a span."""
+
+    __slots__ = ['name', 'start']
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        _spans[self.name] = _spans.get(self.name, 0.0) + elapsed
+
+
+class _NullSpan(object):
+
+    """A context manager which does nothing, used when disabled."""
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+def span(name):
+    """Return a context manager which times a phase of the frame.
+
+    Time spent in spans with the same name in one frame is added up.
+
+    :param name: The name of the phase.
+
+    """
+    if not enabled:
+        return _null_span
+    return _Span(name)
+
+
+def count(name, n=1):
+    """Add to a counter for the current frame.
+
+    :param name: The name of the counter.
+    :param n: The amount to add.
+
+    """
+    if enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def gauge(name, value):
+    """Set a counter for the current frame to an absolute value.
+
+    :param name: The name of the counter.
+    :param value: The value of the counter.
+
+    """
+    if enabled:
+        _counters[name] = value
+
+
+def end_frame():
+    """Finish measuring the current frame, and start the next."""
+    global _spans, _counters, _frame_start
+    if not enabled:
+        return
+    now = time.perf_counter()
+    if _frame_start is not None:
+        frames.append({
+            'time': now - _frame_start,
+            'spans': _spans,
+            'counters': _counters
+        })
+    _spans = {}
+    _counters = {}
+    _frame_start = now
+
+
+def set_enabled(value):
+    """Enable or disable profiling, discarding any partial frame."""
+    global enabled, _spans, _counters, _frame_start
+    enabled = value
+    _spans = {}
+    _counters = {}
+    _frame_start = None
+
+
+def toggle():
+    """Toggle profiling on or off."""
+    set_enabled(not enabled)
+
+
+def summary(n=60):
+    """Summarise the last `n` frames.
+
+    Returns a dict with the mean frame time, the mean time of each span
+    and the counters of the most recent frame. Times are in seconds.
+
+    :param n: The number of frames to summarise.
+
+    """
+    recent = list(frames)[-n:]
+    if not recent:
+        return {'time': 0.0, 'spans': {}, 'counters': {}}
+    spans = {}
+    for frame in recent:
+        for name, elapsed in frame['spans'].items():
+            spans[name] = spans.get(name, 0.0) + elapsed
+    return {
+        'time': sum(frame['time'] for frame in recent) / len(recent),
+        'spans': dict((name, total / len(recent))
+                      for name, total in spans.items()),
+        'counters': dict(recent[-1]['counters'])
+    }
+
+
+def export(path):
+    """Write the frames in the ring buffer to a JSON file.
+
+    :param path: The path of the file to write.
+
+    """
+    with open(path, 'w') as f:
+        json.dump(list(frames), f)
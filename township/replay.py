@@ -0,0 +1,168 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Recording and replaying input, to reproduce performance problems.
+
+A recording is the seed of the world followed by the input events given
+to the user interface, with a marker at the end of each frame saying how
+long that frame took. Replaying feeds the same events to a fresh game on
+the same frames, so it goes through the same states, and times each
+frame as it goes.
+
+Every record is an `EVENT` of (type, x, y, relative x, relative y, code,
+modifiers). What the fields mean depends on the type of event: `code` is
+the key for key events, the button for mouse button events and a mask of
+the pressed buttons for mouse motion. End of frame markers have a type of
+`FRAME` and the duration of the frame in microseconds as their code.
+
+"""
+
+
+import struct
+import time
+
+import pygame
+
+
+MAGIC = b'TSRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHq')
+EVENT = struct.Struct('<HhhhhIH')
+
+FRAME = 0
+
+KEY_EVENTS = (pygame.KEYDOWN, pygame.KEYUP)
+BUTTON_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+
+def pack_event(event):
+    """Serialise an event, returning None if it isn't recorded.
+
+    Only keyboard and mouse events are recorded, since they are all that
+    the game responds to.
+
+    :param event: The pygame event to serialise.
+
+    """
+    if event.type in KEY_EVENTS:
+        return EVENT.pack(event.type, 0, 0, 0, 0, event.key, event.mod)
+    if event.type in BUTTON_EVENTS:
+        return EVENT.pack(event.type, event.pos[0], event.pos[1], 0, 0,
+                          event.button, 0)
+    if event.type == pygame.MOUSEMOTION:
+        buttons = sum(1 << i for i, pressed in enumerate(event.buttons)
+                      if pressed)
+        return EVENT.pack(event.type, event.pos[0], event.pos[1],
+                          event.rel[0], event.rel[1], buttons, 0)
+    return None
+
+
+def unpack_event(kind, x, y, rel_x, rel_y, code, mod):
+    """Create a pygame event from the fields of a record."""
+    if kind in KEY_EVENTS:
+        return pygame.event.Event(kind, key=code, mod=mod, unicode='',
+                                  scancode=0)
+    if kind in BUTTON_EVENTS:
+        return pygame.event.Event(kind, pos=(x, y), button=code)
+    buttons = tuple(bool(code & (1 << i)) for i in range(0, 3))
+    return pygame.event.Event(kind, pos=(x, y), rel=(rel_x, rel_y),
+                              buttons=buttons)
+
+
+class Recorder(object):
+
+    """Writes the input of a game to a recording as it happens."""
+
+    def __init__(self, path, seed, clock=None):
+        """Start a recording.
+
+        :param path: The file to write the recording to.
+        :param seed: The seed of the world being played.
+        :param clock: A function returning the time in seconds, used to
+        time frames. Defaults to `time.perf_counter`.
+
+        """
+        self._clock = clock or time.perf_counter
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, seed))
+        self._frame_start = self._clock()
+
+    def record(self, event):
+        """Record an event, if it is of a type which is recorded."""
+        record = pack_event(event)
+        if record is not None:
+            self._file.write(record)
+
+    def end_frame(self):
+        """Mark the end of a frame, recording how long it took."""
+        now = self._clock()
+        duration = int(round((now - self._frame_start) * 1000000))
+        self._file.write(EVENT.pack(FRAME, 0, 0, 0, 0,
+                                    min(duration, 0xffffffff), 0))
+        self._frame_start = now
+
+    def close(self):
+        """Finish the recording."""
+        if not self._file.closed:
+            self._file.close()
+
+
+def load(path):
+    """Read a recording.
+
+    Returns a tuple of (seed, frames), where `frames` is a list of tuples
+    of (duration, events) for each recorded frame. `duration` is how long
+    the frame took when it was recorded, in seconds.
+
+    :param path: The file containing the recording.
+
+    """
+    with open(path, 'rb') as f:
+        payload = f.read()
+    magic, version, seed = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a version %d recording' % (path, VERSION))
+
+    frames = []
+    events = []
+    for offset in range(HEADER.size, len(payload) - EVENT.size + 1,
+                        EVENT.size):
+        fields = EVENT.unpack_from(payload, offset)
+        if fields[0] == FRAME:
+            frames.append((fields[5] / 1000000.0, events))
+            events = []
+        else:
+            events.append(unpack_event(*fields))
+    return seed, frames
+
+
+def summarise(durations):
+    """Summarise a list of frame durations in seconds."""
+    durations = sorted(durations)
+    if not durations:
+        return {'frames': 0}
+
+    def percentile(p):
+        return durations[min(len(durations) - 1, int(len(durations) * p))]
+
+    return {
+        'frames': len(durations),
+        'total': sum(durations),
+        'mean': sum(durations) / len(durations),
+        'median': percentile(0.5),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'max': durations[-1],
+    }
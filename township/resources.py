@@ -13,8 +13,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import random
-
 from township import images
 
 
@@ -22,6 +20,8 @@ class Resource(object):
 
     """Base class for resources that appear on the map."""
 
+    colour = [255, 255, 255]
+
     def __init__(self, chunk, tile, x, y, value):
         """Initialise the resource.
 
@@ -36,11 +36,21 @@ class Resource(object):
         self.tile = tile
         self.x = x
         self.y = y
-        self.value = value
+        self._value = value
 
         self.type = None
         self.image = None
-        self.colour = [255, 255, 255]
+
+    @property
+    def value(self):
+        """The amount of resource this resource gives."""
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        # The resource is described as part of its tile
+        self.tile.version += 1
 
     def __str__(self):
         return '%d %s' % (self.value, self.type)
@@ -70,7 +80,10 @@ class Rock(Resource):
 
     """Representation of a Rock resource node."""
 
-    def __init__(self, chunk, tile, x, y, value):
+    variations = ['a', 'b']
+    colour = [100, 100, 100]
+
+    def __init__(self, chunk, tile, x, y, value, variation='a'):
         """Initialise the rock.
 
         :param chunk: The chunk this rock is in.
@@ -78,24 +91,33 @@ class Rock(Resource):
         :param x: The x position of the rock in the world.
         :param y: The y position of the rock in the world.
         :param value: The amount of stone this rock provides.
+        :param variation: Which of the rock images to use.
 
         """
         super(Rock, self).__init__(chunk, tile, x, y, value)
 
         self.type = 'stone'
-        ext = 'a' if random.random() > 0.5 else 'b'
+        self.variation = variation
+        ext = variation
         # TODO(SotK): check tile type not height
         if tile.height > 0.4:
             ext += '-shadow'
         self.image = images.get_map_resource('rock' + ext)
-        self.colour = [100, 100, 100]
+
+    @classmethod
+    def get_variation(cls, rng):
+        """Pick a rock variation using the given random number generator."""
+        return cls.variations[0] if rng.random() > 0.5 else cls.variations[1]
 
 
 class Tree(Resource):
 
     """Representation of a Tree resource node."""
 
-    def __init__(self, chunk, tile, x, y, value):
+    variations = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+    colour = [26, 109, 26]
+
+    def __init__(self, chunk, tile, x, y, value, variation='a'):
         """Initialise the tree.
 
         :param chunk: The chunk this tree is in.
@@ -103,18 +125,19 @@ class Tree(Resource):
         :param x: The x position of the tree in the world.
         :param y: The y position of the tree in the world.
         :param value: The amount of wood this tree provides.
+        :param variation: Which of the tree images to use.
 
         """
         super(Tree, self).__init__(chunk, tile, x, y, value)
 
         self.type = 'wood'
-        ext = self.get_variation()
-        self.image = images.get_map_resource('tree' + ext)
-        self.colour = [26, 109, 26]
+        self.variation = variation
+        self.image = images.get_map_resource('tree' + variation)
 
-    def get_variation(self):
-        variations = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
-        return variations[random.randint(0, len(variations)-1)]
+    @classmethod
+    def get_variation(cls, rng):
+        """Pick a tree variation using the given random number generator."""
+        return cls.variations[rng.randint(0, len(cls.variations)-1)]
 
     def draw(self, surface, rendermode='tiles'):
         """Draw the tree onto the given surface.
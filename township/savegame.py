@@ -0,0 +1,366 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Saving and loading games.
+
+A save is a directory. Chunks are generated from the world seed, so only
+the ways a chunk differs from its generated content are saved, with one
+delta file for each chunk which has any. Villagers are saved as fixed size
+records in a single file, and everything else goes in ``world.json``.
+
+Snapshots are incremental. Only files whose content has changed since the
+previous snapshot are written, and only the records of villagers which
+have changed are rewritten in the villagers file. The writing happens on
+a background thread, so taking a snapshot only costs the frame the time
+it takes to serialise the changes.
+
+Loading a save is lazy. Chunk deltas are only read when their chunks are
+loaded by the map, and stockpiles gain their tiles as that happens.
+
+"""
+
+
+import json
+import os
+import struct
+import threading
+
+import numpy
+from six.moves import queue
+
+from township import population
+from township.actors import Villager
+from township.constructions import Stockpile
+from township.map import Map
+
+
+VERSION = 1
+
+DELTA_MAGIC = b'TSCD'
+DELTA_HEADER = struct.Struct('<4sHiiI')
+# A construction on a tile, as (tile index in the chunk, construction id)
+DELTA_ENTRY = struct.Struct('<BI')
+
+VILLAGERS_MAGIC = b'TSVL'
+VILLAGERS_HEADER = struct.Struct('<4sHI')
+# Position, target and velocity, state, then the stats in `STATS` order
+VILLAGER = struct.Struct('<6dB7d')
+
+STATES = ['idle', 'moving']
+STATS = population.STATS
+
+
+def pack_delta(chunk):
+    """Serialise the ways a chunk differs from its generated content.
+
+    Returns None if the chunk is unchanged. Constructions are saved by
+    their id in the map's ConstructionTable.
+
+    :param chunk: The chunk to serialise.
+
+    """
+    occupancy = chunk.occupancy.ravel()
+    entries = [DELTA_ENTRY.pack(index, construction)
+               for index, construction in zip(
+                   numpy.flatnonzero(occupancy).tolist(),
+                   occupancy[occupancy != 0].tolist())]
+    if not entries:
+        return None
+    header = DELTA_HEADER.pack(DELTA_MAGIC, VERSION, chunk.x, chunk.y,
+                               len(entries))
+    return header + b''.join(entries)
+
+
+def unpack_delta(payload):
+    """Deserialise a chunk delta created by `pack_delta`.
+
+    Returns a list of (tile x, tile y, construction id) tuples, with tile
+    positions relative to the chunk.
+
+    :param payload: The bytes to deserialise.
+
+    """
+    magic, version, _, _, count = DELTA_HEADER.unpack_from(payload, 0)
+    if magic != DELTA_MAGIC or version != VERSION:
+        raise ValueError('Not a version %d chunk delta' % VERSION)
+    entries = []
+    for i in range(0, count):
+        offset = DELTA_HEADER.size + i * DELTA_ENTRY.size
+        index, construction = DELTA_ENTRY.unpack_from(payload, offset)
+        entries.append((index // 16, index % 16, construction))
+    return entries
+
+
+def pack_villager(villager):
+    """Serialise the state of a villager which fits in a fixed size record.
+
+    :param villager: The villager to serialise.
+
+    """
+    return VILLAGER.pack(villager.position[0], villager.position[1],
+                         villager.target[0], villager.target[1],
+                         villager.velocity.x, villager.velocity.y,
+                         STATES.index(villager.state),
+                         *[villager.stats[stat] for stat in STATS])
+
+
+def unpack_villager(villager, record):
+    """Restore the state of a villager from a record.
+
+    :param villager: The villager to restore the state of.
+    :param record: A record created by `pack_villager`.
+
+    """
+    values = VILLAGER.unpack(record)
+    villager.position = [values[0], values[1]]
+    if villager.position == [values[2], values[3]]:
+        # Idle villagers target their own position
+        villager.target = villager.position
+    else:
+        villager.target = [values[2], values[3]]
+    villager.velocity.set(values[4], values[5])
+    villager.state = STATES[values[6]]
+    villager.stats = dict(zip(STATS, values[7:]))
+
+
+class SaveGame(object):
+
+    """A directory containing a saved game."""
+
+    def __init__(self, path):
+        """Open a save, which doesn't need to exist yet.
+
+        :param path: The directory containing the save.
+
+        """
+        self.path = path
+        # The content of every file as of the last snapshot, keyed by
+        # the file's path relative to the save, so unchanged files can be
+        # skipped. Deltas of chunks which haven't been loaded yet aren't
+        # in here, since they can't have changed.
+        self._files = {}
+        # The villager records as of the last snapshot, or None if there
+        # isn't a villagers file yet.
+        self._records = None
+        self._chunk_versions = {}
+        self._deltas = set()
+
+        self._jobs = queue.Queue()
+        self._writer = None
+
+    def __contains__(self, position):
+        """Return True if the save has a delta for a chunk position."""
+        return position in self._deltas
+
+    def exists(self):
+        """Return True if there is a saved game at this save's path."""
+        return os.path.exists(os.path.join(self.path, 'world.json'))
+
+    def _chunk_name(self, x, y):
+        return os.path.join('chunks', '%d_%d.delta' % (x, y))
+
+    def _read(self, name):
+        with open(os.path.join(self.path, name), 'rb') as f:
+            return f.read()
+
+    def load(self):
+        """Load the saved game, returning the `township.map.Map` it contains.
+
+        Only the world state is read here. Chunk deltas are applied by the
+        map as it loads the chunks they belong to, using `restore_chunk`.
+
+        """
+        world = json.loads(self._read('world.json').decode('utf-8'))
+        if world['version'] != VERSION:
+            raise ValueError('Save %s is not a version %d save'
+                             % (self.path, VERSION))
+        self._files['world.json'] = self._read('world.json')
+
+        game_map = Map(world['seed'], generate=False)
+        for saved in world['stockpiles']:
+            stockpile = Stockpile([])
+            stockpile.content = [None for i in range(0, saved['spaces'])]
+            stockpile.tile_max = saved['tile_max']
+            game_map.constructions.add(stockpile)
+
+        payload = self._read('villagers.bin')
+        magic, version, count = VILLAGERS_HEADER.unpack_from(payload, 0)
+        if magic != VILLAGERS_MAGIC or version != VERSION:
+            raise ValueError('Not a version %d villagers file' % VERSION)
+        villagers = []
+        self._records = []
+        for i in range(0, count):
+            offset = VILLAGERS_HEADER.size + i * VILLAGER.size
+            record = payload[offset:offset + VILLAGER.size]
+            villager = Villager()
+            unpack_villager(villager, record)
+            villager.name = world['villagers'][i]['name']
+            villager.role = world['villagers'][i]['role']
+            villagers.append(villager)
+            self._records.append(record)
+        for villager in list(game_map.actors):
+            game_map.remove_villager(villager)
+        for villager in villagers:
+            game_map.add_villager(villager)
+        for villager, saved in zip(villagers, world['villagers']):
+            for other, value in saved['relationships']:
+                game_map.population.set_affinity(
+                    villager.index, villagers[other].index, value)
+
+        chunks = os.path.join(self.path, 'chunks')
+        if os.path.isdir(chunks):
+            for name in os.listdir(chunks):
+                if name.endswith('.delta'):
+                    x, y = name[:-len('.delta')].split('_')
+                    self._deltas.add((int(x), int(y)))
+        game_map.savegame = self
+        return game_map
+
+    def restore_chunk(self, game_map, chunk):
+        """Apply the saved delta of a newly loaded chunk, if it has one.
+
+        :param game_map: The map the chunk belongs to.
+        :param chunk: The chunk to apply the delta to.
+
+        """
+        if (chunk.x, chunk.y) not in self._deltas:
+            return
+        name = self._chunk_name(chunk.x, chunk.y)
+        payload = self._read(name)
+        for u, v, construction in unpack_delta(payload):
+            stockpile = game_map.constructions.get(construction)
+            stockpile.tiles.append(chunk.get_tile(u, v))
+            chunk.occupancy[u, v] = construction
+        chunk.dirty = True
+        self._files[name] = payload
+        # The delta is only needed once, the chunk is pinned from now on
+        self._deltas.discard((chunk.x, chunk.y))
+
+    def snapshot(self, game_map, full=False):
+        """Save the changes to a map since the last snapshot.
+
+        The changes are serialised straight away, and written to disk in
+        the background. Returns the number of files which changed.
+
+        :param game_map: The map to save.
+        :param full: Whether to check every loaded chunk for changes.
+        Otherwise only chunks which have been re-rendered since the last
+        snapshot are checked, since chunks are always re-rendered when
+        their content changes. Chunks which haven't been rendered since
+        changing are missed in that case, so the final snapshot before
+        exiting should be a full one.
+
+        """
+        changes = {}
+        versions = {}
+        for position, chunk in game_map.chunks.items():
+            versions[position] = chunk.version
+            unchanged = self._chunk_versions.get(position) == chunk.version
+            if not full and unchanged:
+                continue
+            changes[self._chunk_name(*position)] = pack_delta(chunk)
+        self._chunk_versions = versions
+
+        game_map.actor_scheduler.synchronise()
+        villagers = list(game_map.actors)
+        index = dict((villager, i) for i, villager in enumerate(villagers))
+        world = {
+            'version': VERSION,
+            'seed': game_map.seed,
+            'stockpiles': [{'spaces': len(stockpile.content),
+                            'tile_max': stockpile.tile_max}
+                           for stockpile in game_map.constructions],
+            'villagers': [{'name': villager.name,
+                           'role': villager.role,
+                           'relationships': [
+                               [index[other], value] for other, value
+                               in villager.relationships.items()
+                               if other in index]}
+                          for villager in villagers],
+        }
+        changes['world.json'] = json.dumps(world).encode('utf-8')
+
+        changes = dict((name, content) for name, content in changes.items()
+                       if self._files.get(name) != content)
+        self._files.update(changes)
+
+        records = [pack_villager(villager) for villager in villagers]
+        patches = []
+        if self._records is None or len(records) != len(self._records):
+            header = VILLAGERS_HEADER.pack(VILLAGERS_MAGIC, VERSION,
+                                           len(records))
+            changes['villagers.bin'] = header + b''.join(records)
+        else:
+            for i, record in enumerate(records):
+                if record != self._records[i]:
+                    offset = VILLAGERS_HEADER.size + i * VILLAGER.size
+                    patches.append((offset, record))
+        self._records = records
+        if changes or patches:
+            self._start_writer()
+            self._jobs.put((changes, patches))
+        return len(changes) + len(patches)
+
+    def flush(self):
+        """Wait for every snapshot taken so far to be written."""
+        if self._writer is not None:
+            self._jobs.join()
+
+    def close(self):
+        """Write every snapshot taken so far, then stop the writer."""
+        if self._writer is not None:
+            self._jobs.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_jobs)
+            # The writer only stops when the save is closed, so it can't
+            # hold up exiting, but anything queued is lost unless it is.
+            self._writer.daemon = True
+            self._writer.start()
+
+    def _write_jobs(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._jobs.task_done()
+                return
+            changes, patches = job
+            try:
+                self._write(changes, patches)
+            finally:
+                self._jobs.task_done()
+
+    def _write(self, changes, patches):
+        chunks = os.path.join(self.path, 'chunks')
+        if not os.path.isdir(chunks):
+            os.makedirs(chunks)
+        # world.json goes last, so that a save only exists once the
+        # rest of its first snapshot has been written.
+        for name in sorted(changes, key=lambda name: name == 'world.json'):
+            path = os.path.join(self.path, name)
+            if changes[name] is None:
+                os.remove(path)
+                continue
+            with open(path + '.tmp', 'wb') as f:
+                f.write(changes[name])
+            os.rename(path + '.tmp', path)
+        if patches:
+            with open(os.path.join(self.path, 'villagers.bin'), 'r+b') as f:
+                for offset, record in patches:
+                    f.seek(offset)
+                    f.write(record)
@@ -0,0 +1,88 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Time-sliced rendering of map chunks.
+
+Rendering a chunk's tiles takes around a millisecond, so rendering every
+chunk which became dirty in a frame at once can cause a long frame, for
+example when a large stockpile is created. Instead, dirty chunks are
+queued and rendered in priority order until the frame's time budget is
+used up. Chunks waiting in the queue keep showing their old surface.
+
+"""
+
+
+import heapq
+import time
+
+from township import conf
+from township import profiling
+
+
+class RenderScheduler(object):
+
+    """Renders the dirty chunks of a map within a per-frame time budget."""
+
+    def __init__(self, game_map, budget=None):
+        """Initialise the scheduler.
+
+        :param game_map: The map whose chunks to render.
+        :param budget: The time to spend rendering each frame, in
+        milliseconds. Defaults to `conf.RENDER_BUDGET_MS`.
+
+        """
+        self.map = game_map
+        self.budget = budget if budget is not None else conf.RENDER_BUDGET_MS
+        # The number of dirty chunks left waiting after the last run.
+        self.pending = 0
+
+    def _queue(self, focus_x, focus_y):
+        queue = []
+        for position, chunk in self.map.chunks.items():
+            if not chunk.dirty:
+                continue
+            distance = ((position[0] + 0.5 - focus_x)**2 +
+                        (position[1] + 0.5 - focus_y)**2)
+            offscreen = chunk not in self.map.render_set
+            queue.append((offscreen, distance, position))
+        heapq.heapify(queue)
+        return queue
+
+    def run(self, focus_x, focus_y):
+        """Render dirty chunks until this frame's budget is used up.
+
+        Chunks on screen are rendered first, nearest to the focus first,
+        followed by the other loaded chunks in the same order. At least
+        one chunk is rendered if any are dirty, so that the queue always
+        drains eventually however small the budget is.
+
+        :param focus_x: The x position to render chunks around, in chunks.
+        :param focus_y: The y position to render chunks around, in chunks.
+
+        """
+        queue = self._queue(focus_x, focus_y)
+        deadline = time.perf_counter() + self.budget / 1000.0
+        while queue:
+            _, _, position = heapq.heappop(queue)
+            chunk = self.map.chunks[position]
+            chunk.dirty = False
+            with profiling.span('rerender'):
+                chunk.render()
+            profiling.count('chunks_rerendered')
+            if time.perf_counter() >= deadline:
+                break
+        self.pending = len(queue)
+        if profiling.enabled:
+            profiling.gauge('render_queue', self.pending)
@@ -0,0 +1,129 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Evaluation of world seeds by the terrain around the spawn point.
+
+For each seed, the terrain in a square around the spawn point is sampled
+with batched noise and summarised as statistics, which are combined into
+a score used to rank the seeds. Seeds are evaluated in parallel.
+
+"""
+
+
+import multiprocessing
+
+import numpy
+
+from township.map import (TERRAIN_BANDS, classify_heights, make_generators,
+                          sample_terrain)
+
+
+# The tile the first villager starts on.
+SPAWN = (500 // 16, 500 // 16)
+
+TILE_TYPES = ['water', 'sand', 'grass', 'upland', 'mountain']
+
+# The index in TILE_TYPES of the tile type of each terrain band.
+_BAND_TYPES = numpy.array([TILE_TYPES.index(band[1])
+                           for band in TERRAIN_BANDS])
+
+
+def evaluate(seed, radius=64, step=1, octaves=5):
+    """Compute statistics about the terrain around the spawn point.
+
+    Returns a dict with the seed, the ratio of each tile type, the density
+    of rocks and trees, the distance in tiles from the spawn point to the
+    nearest water (None if there is none in range) and the overall score.
+
+    :param seed: The seed of the world.
+    :param radius: The distance around the spawn point to sample, in
+    tiles.
+    :param step: Only sample every `step`th tile, for a faster but lower
+    resolution evaluation.
+    :param octaves: The number of octaves of noise to sample with.
+
+    """
+    x = SPAWN[0] - radius
+    y = SPAWN[1] - radius
+    heights, rocks, trees = sample_terrain(
+        x, y, 2 * radius, 2 * radius, *make_generators(seed),
+        step=step, octaves=octaves)
+    types = _BAND_TYPES[classify_heights(heights)]
+
+    stats = {'seed': seed}
+    for i, tile_type in enumerate(TILE_TYPES):
+        stats[tile_type] = float(numpy.mean(types == i))
+    stats['rocks'] = float(numpy.mean(rocks))
+    stats['trees'] = float(numpy.mean(trees))
+
+    water_x, water_y = numpy.nonzero(types == TILE_TYPES.index('water'))
+    if len(water_x):
+        dx = x + water_x * step - SPAWN[0]
+        dy = y + water_y * step - SPAWN[1]
+        stats['water_distance'] = float(numpy.min(numpy.hypot(dx, dy)))
+    else:
+        stats['water_distance'] = None
+
+    stats['score'] = score(stats, radius)
+    return stats
+
+
+def score(stats, radius):
+    """Score the statistics of a seed. Higher scores are better.
+
+    Good starting areas are mostly buildable land, with some trees and
+    rocks to gather and water close to the spawn point.
+
+    :param stats: The statistics of a seed, as computed by `evaluate`.
+    :param radius: The radius the statistics were computed over.
+
+    """
+    value = stats['grass'] + 0.5 * stats['sand'] + 0.25 * stats['upland']
+    value += 2 * min(stats['trees'], 0.15) + 4 * min(stats['rocks'], 0.05)
+    if stats['water_distance'] is None:
+        value -= 0.5
+    else:
+        value -= 0.5 * stats['water_distance'] / radius
+    return value
+
+
+def _evaluate(args):
+    return evaluate(*args)
+
+
+def scan(seeds, radius=64, step=1, octaves=5, workers=None):
+    """Evaluate many seeds in parallel, returning their stats by score.
+
+    :param seeds: An iterable of seeds to evaluate.
+    :param radius: The distance around the spawn point to sample.
+    :param step: Only sample every `step`th tile.
+    :param octaves: The number of octaves of noise to sample with.
+    :param workers: The number of worker processes to use. Defaults to
+    the number of CPUs. If this is 1 no processes are started.
+
+    """
+    tasks = [(seed, radius, step, octaves) for seed in seeds]
+    if workers == 1:
+        results = [_evaluate(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_evaluate, tasks, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
+    return sorted(results, key=lambda stats: (-stats['score'],
+                                              stats['seed']))
@@ -0,0 +1,470 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Serve a simulated map to any number of viewing clients.
+
+The server owns the `township.map.Map` and runs its simulation. Clients
+subscribe to a region of chunks and are sent the chunks in it, along with
+the positions of actors as they change. Every message is a header of
+(payload length, message type) followed by the payload:
+
+- ``SUBSCRIBE``, from a client: the chunk region (x0, y0, x1, y1) to
+  watch, where x1 and y1 are exclusive. Regions are cut down to at most
+  `conf.SERVER_MAX_REGION` chunks across from their top left corner.
+- ``CHUNK``, from the server: a chunk compressed with zlib. The
+  decompressed payload is the chunk as packed by
+  `township.chunkstore.pack_chunk`, followed by its constructions as
+  packed by `township.savegame.pack_delta` if it has any.
+- ``ACTORS``, from the server: the tick number and a count, then an (id,
+  x, y) record for each actor which has moved or appeared since the
+  previous tick.
+- ``REMOVED``, from the server: the ids of actors which no longer exist.
+
+Chunks are compressed once and shared by every client until they change,
+and actor updates are encoded once per tick for all clients. Chunks are
+built from their generated content rather than loaded into the map, and
+at most `conf.SERVER_CHUNKS_PER_TICK` are built each tick, nearest the
+middle of each region first. The most recently sent
+`conf.SERVER_CHUNK_CACHE_SIZE` messages are kept. The tick never waits for
+clients to read what they're sent. Clients which fall so
+far behind that more than `conf.SERVER_MAX_BUFFER` bytes are waiting to
+be sent to them are disconnected instead.
+
+Connections can use TCP, or be made in-process with `loopback`.
+
+"""
+
+
+import asyncio
+import collections
+import struct
+import zlib
+
+from township import conf
+from township.chunkstore import HEADER, HEIGHTS, TILES_PER_CHUNK
+from township.chunkstore import pack_chunk, unpack_chunk
+from township.savegame import pack_delta, unpack_delta
+
+
+MESSAGE = struct.Struct('<IB')
+SUBSCRIBE = 1
+CHUNK = 2
+ACTORS = 3
+REMOVED = 4
+
+REGION = struct.Struct('<iiii')
+ACTORS_HEADER = struct.Struct('<II')
+ACTOR = struct.Struct('<Iff')
+ACTOR_ID = struct.Struct('<I')
+
+# The size of a chunk packed by `pack_chunk`, after which comes its delta
+CHUNK_SIZE = HEADER.size + HEIGHTS.size + 4 * TILES_PER_CHUNK
+
+
+def message(kind, payload):
+    """Return a message of the given type, ready to be sent.
+
+    :param kind: The type of the message.
+    :param payload: The payload of the message, as bytes.
+
+    """
+    return MESSAGE.pack(len(payload), kind) + payload
+
+
+async def read_message(reader):
+    """Read a message, returning a tuple of (type, payload).
+
+    Returns (None, None) if the connection was closed.
+
+    :param reader: The stream to read the message from.
+
+    """
+    try:
+        header = await reader.readexactly(MESSAGE.size)
+        length, kind = MESSAGE.unpack(header)
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None, None
+    return kind, payload
+
+
+def clamp_region(region):
+    """Cut a subscribed region down to the largest allowed size.
+
+    :param region: The (x0, y0, x1, y1) region of chunks.
+
+    """
+    x0, y0, x1, y1 = region
+    size = conf.SERVER_MAX_REGION
+    return (x0, y0, max(x0, min(x1, x0 + size)), max(y0, min(y1, y0 + size)))
+
+
+class _LoopbackWriter(object):
+
+    """A stream writer which feeds data straight into a stream reader."""
+
+    def __init__(self, reader):
+        self._reader = reader
+        self._closing = False
+
+    def write(self, data):
+        self._reader.feed_data(data)
+
+    def get_write_buffer_size(self):
+        # Data is handed straight to the reader, so nothing is buffered
+        return 0
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        if not self._closing:
+            self._closing = True
+            self._reader.feed_eof()
+
+    def is_closing(self):
+        return self._closing
+
+    async def wait_closed(self):
+        pass
+
+
+def loopback():
+    """Return two ends of an in-process connection.
+
+    Each end is a tuple of (reader, writer), which behave like the streams
+    of a TCP connection. Must be called with an event loop running.
+
+    """
+    a = asyncio.StreamReader()
+    b = asyncio.StreamReader()
+    return (a, _LoopbackWriter(b)), (b, _LoopbackWriter(a))
+
+
+class _Connection(object):
+
+    """The server's view of a connected client."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.region = None
+        # The chunk positions in the region which have been sent
+        self.sent = set()
+        # The chunk positions in the region still to send, in order
+        self.pending = collections.deque()
+
+    def backlog(self):
+        """Return the number of bytes waiting to be sent to the client."""
+        transport = getattr(self.writer, 'transport', self.writer)
+        return transport.get_write_buffer_size()
+
+    def wants(self, position):
+        if self.region is None:
+            return False
+        x0, y0, x1, y1 = self.region
+        return x0 <= position[0] < x1 and y0 <= position[1] < y1
+
+
+class MapServer(object):
+
+    """Runs the simulation of a map and serves it to clients."""
+
+    def __init__(self, game_map, tick_rate=None):
+        """Initialise the server.
+
+        :param game_map: The map to simulate and serve.
+        :param tick_rate: The number of simulation ticks per second.
+        Defaults to `conf.SERVER_TICK_RATE`.
+
+        """
+        self.map = game_map
+        self.tick_rate = tick_rate or conf.SERVER_TICK_RATE
+        self.ticks = 0
+        self.connections = set()
+        # Compressed chunk messages, keyed by chunk position, least
+        # recently sent first
+        self._chunks = collections.OrderedDict()
+        self._actor_ids = {}
+        self._next_actor_id = 1
+        # The last position sent for each actor, keyed by actor id
+        self._positions = {}
+
+    def _actor_id(self, actor):
+        if actor not in self._actor_ids:
+            self._actor_ids[actor] = self._next_actor_id
+            self._next_actor_id += 1
+        return self._actor_ids[actor]
+
+    def chunk_message(self, x, y):
+        """Return the message sending a chunk, compressing it if needed.
+
+        :param x: The x position of the chunk.
+        :param y: The y position of the chunk.
+
+        """
+        cached = self._chunks.get((x, y))
+        if cached is not None:
+            self._chunks.move_to_end((x, y))
+            return cached
+        chunk = self.map.chunks.get((x, y))
+        if chunk is None and self.map.savegame is not None and (
+                (x, y) in self.map.savegame):
+            # Saved changes can only be restored into a loaded chunk
+            chunk = self.map.get_chunk(x, y)
+        if chunk is None:
+            payload = pack_chunk(x, y, self.map.chunk_data(x, y))
+        else:
+            chunk.dirty = False
+            payload = pack_chunk(x, y, chunk.get_data())
+            payload += pack_delta(chunk) or b''
+        cached = message(CHUNK, zlib.compress(payload))
+        self._chunks[(x, y)] = cached
+        while len(self._chunks) > conf.SERVER_CHUNK_CACHE_SIZE:
+            self._chunks.popitem(last=False)
+        return cached
+
+    def _actors_message(self, full=False):
+        records = []
+        for actor in self.map.actors:
+            actor_id = self._actor_id(actor)
+            position = (actor.position[0], actor.position[1])
+            if full or self._positions.get(actor_id) != position:
+                records.append(ACTOR.pack(actor_id, *position))
+                if not full:
+                    self._positions[actor_id] = position
+        if not records:
+            return b''
+        header = ACTORS_HEADER.pack(self.ticks, len(records))
+        return message(ACTORS, header + b''.join(records))
+
+    def _removed_message(self):
+        alive = set(self._actor_ids[actor] for actor in self.map.actors
+                    if actor in self._actor_ids)
+        removed = [actor_id for actor_id in self._positions
+                   if actor_id not in alive]
+        if not removed:
+            return b''
+        for actor_id in removed:
+            del self._positions[actor_id]
+        self._actor_ids = dict((actor, actor_id) for actor, actor_id
+                               in self._actor_ids.items()
+                               if actor_id in alive)
+        return message(REMOVED, b''.join(ACTOR_ID.pack(actor_id)
+                                         for actor_id in removed))
+
+    def _queue_region(self, connection):
+        x0, y0, x1, y1 = connection.region
+        connection.sent = set(position for position in connection.sent
+                              if connection.wants(position))
+        pending = [(x, y) for x in range(x0, x1) for y in range(y0, y1)
+                   if (x, y) not in connection.sent]
+        pending.sort(key=lambda position: (
+            (2 * position[0] + 1 - x0 - x1)**2 +
+            (2 * position[1] + 1 - y0 - y1)**2))
+        connection.pending = collections.deque(pending)
+
+    def _send_pending(self):
+        """Send queued chunks, building at most a few new messages.
+
+        Chunks with a message already cached are sent straight away. The
+        connections take turns at building the rest.
+
+        """
+        builds = conf.SERVER_CHUNKS_PER_TICK
+        waiting = [connection for connection in self.connections
+                   if connection.pending]
+        while waiting:
+            for connection in list(waiting):
+                position = connection.pending.popleft()
+                if position not in self._chunks:
+                    if builds <= 0:
+                        connection.pending.appendleft(position)
+                        return
+                    builds -= 1
+                connection.writer.write(self.chunk_message(*position))
+                connection.sent.add(position)
+                if not connection.pending:
+                    waiting.remove(connection)
+
+    def tick(self):
+        """Advance the simulation by one tick, and send out the changes.
+
+        Chunks which have changed are compressed again and sent to the
+        clients watching them, followed by some of the chunks queued for
+        newly subscribed regions. The actors which moved are sent to every
+        client in a single batch.
+
+        """
+        self.ticks += 1
+        self.map.actors.update(0, 0)
+
+        # The server doesn't render, so a chunk being dirty just means
+        # that it has changed since it was last sent.
+        for position, chunk in list(self.map.chunks.items()):
+            if not chunk.dirty:
+                continue
+            chunk.dirty = False
+            self._chunks.pop(position, None)
+            for connection in self.connections:
+                if position in connection.sent:
+                    connection.writer.write(self.chunk_message(*position))
+        self._send_pending()
+
+        update = self._actors_message() + self._removed_message()
+        if update:
+            for connection in self.connections:
+                connection.writer.write(update)
+
+    def _drop_slow_clients(self):
+        for connection in list(self.connections):
+            if connection.backlog() > conf.SERVER_MAX_BUFFER:
+                self.connections.discard(connection)
+                connection.writer.close()
+
+    async def handle(self, reader, writer):
+        """Serve a single client until it disconnects.
+
+        :param reader: The stream to read the client's messages from.
+        :param writer: The stream to write messages to the client with.
+
+        """
+        connection = _Connection(writer)
+        self.connections.add(connection)
+        writer.write(self._actors_message(full=True))
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind is None:
+                    break
+                if kind == SUBSCRIBE:
+                    connection.region = clamp_region(REGION.unpack(payload))
+                    self._queue_region(connection)
+                await writer.drain()
+        finally:
+            self.connections.discard(connection)
+            writer.close()
+
+    async def run(self, host=None, port=None):
+        """Serve clients over TCP while running the simulation forever.
+
+        :param host: The address to listen on. Defaults to
+        `conf.SERVER_HOST`.
+        :param port: The port to listen on. Defaults to
+        `conf.SERVER_PORT`.
+
+        """
+        server = await asyncio.start_server(self.handle,
+                                            host or conf.SERVER_HOST,
+                                            port or conf.SERVER_PORT)
+        async with server:
+            await self.simulate()
+
+    async def simulate(self, ticks=None):
+        """Run the simulation at the server's tick rate.
+
+        :param ticks: The number of ticks to run for, or None to run
+        forever.
+
+        """
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while ticks is None or ticks > 0:
+            self.tick()
+            self._drop_slow_clients()
+            next_tick += interval
+            await asyncio.sleep(max(0, next_tick - loop.time()))
+            if ticks is not None:
+                ticks -= 1
+
+
+class MapClient(object):
+
+    """A client which keeps a copy of what it's subscribed to."""
+
+    def __init__(self, reader, writer):
+        """Initialise the client.
+
+        :param reader: The stream to read the server's messages from.
+        :param writer: The stream to write messages to the server with.
+
+        """
+        self.reader = reader
+        self.writer = writer
+        self.ticks = 0
+        # The content of each received chunk, keyed by position, as
+        # tuples of (data, constructions). `data` is in the form returned
+        # by `township.map.generate_chunk_data`, and `constructions` is a
+        # list of (tile x, tile y, construction id) tuples.
+        self.chunks = {}
+        # The position of each actor, keyed by actor id
+        self.actors = {}
+
+    async def subscribe(self, x0, y0, x1, y1):
+        """Watch a region of chunks, replacing any previous region.
+
+        :param x0: The x position of the first chunk in the region.
+        :param y0: The y position of the first chunk in the region.
+        :param x1: The x position of the chunk after the region.
+        :param y1: The y position of the chunk after the region.
+
+        """
+        self.writer.write(message(SUBSCRIBE, REGION.pack(x0, y0, x1, y1)))
+        await self.writer.drain()
+
+    def apply(self, kind, payload):
+        """Update the client's copy of the map with a message.
+
+        :param kind: The type of the message.
+        :param payload: The payload of the message.
+
+        """
+        if kind == CHUNK:
+            payload = zlib.decompress(payload)
+            x, y, data = unpack_chunk(payload)
+            constructions = []
+            if len(payload) > CHUNK_SIZE:
+                constructions = unpack_delta(payload[CHUNK_SIZE:])
+            self.chunks[(x, y)] = (data, constructions)
+        elif kind == ACTORS:
+            self.ticks, count = ACTORS_HEADER.unpack_from(payload, 0)
+            for i in range(0, count):
+                offset = ACTORS_HEADER.size + i * ACTOR.size
+                actor_id, x, y = ACTOR.unpack_from(payload, offset)
+                self.actors[actor_id] = (x, y)
+        elif kind == REMOVED:
+            for i in range(0, len(payload) // ACTOR_ID.size):
+                actor_id, = ACTOR_ID.unpack_from(payload, i * ACTOR_ID.size)
+                self.actors.pop(actor_id, None)
+
+    async def receive(self):
+        """Receive and apply one message, returning its type.
+
+        Returns None if the server closed the connection.
+
+        """
+        kind, payload = await read_message(self.reader)
+        if kind is not None:
+            self.apply(kind, payload)
+        return kind
+
+    async def run(self):
+        """Receive messages until the server closes the connection."""
+        while await self.receive() is not None:
+            pass
+
+    def close(self):
+        """Close the connection to the server."""
+        self.writer.close()
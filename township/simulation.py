@@ -0,0 +1,337 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Simulation of actors across multiple processes.
+
+The world is divided into square regions of chunks, and the actors in
+each region form a shard. Actor state is kept in arrays rather than in
+sprites. Each worker process owns a fixed set of regions and keeps their
+shards between steps. After each step, actors which have moved out of
+their shard's region are handed off to the shard which owns their new
+position, and only those moving to another worker's region are sent
+between processes.
+
+Stepping is a pure function of the actor state, and shards are merged in
+order of actor id, so the result doesn't depend on how the work was
+split between processes.
+
+The game itself keeps actor state in its sprites, and only uses `step`,
+in process, to catch up actors away from the view (see
+`township.lod`). `Simulation` is exercised by the benchmarks in
+`bench.py`.
+
+"""
+
+
+import multiprocessing
+
+import numpy
+
+from township import conf
+from township.util import vectors
+
+
+# The distance from its target at which a moving actor stops
+ARRIVAL_DISTANCE = 4
+
+# The arrays making up a set of actor state, all indexed by actor
+FIELDS = ['ids', 'position', 'target', 'velocity', 'moving']
+
+
+def empty_state():
+    """Return the state of no actors."""
+    return {
+        'ids': numpy.zeros(0, dtype=numpy.int64),
+        'position': numpy.zeros((0, 2)),
+        'target': numpy.zeros((0, 2)),
+        'velocity': numpy.zeros((0, 2)),
+        'moving': numpy.zeros(0, dtype=bool),
+    }
+
+
+def select(state, mask):
+    """Return the state of the actors where a boolean mask is True."""
+    return dict((field, state[field][mask]) for field in FIELDS)
+
+
+def merge(states):
+    """Combine several sets of actor state, ordered by actor id."""
+    states = [state for state in states if len(state['ids'])]
+    if not states:
+        return empty_state()
+    merged = dict((field, numpy.concatenate([state[field]
+                                             for state in states]))
+                  for field in FIELDS)
+    return select(merged, numpy.argsort(merged['ids'], kind='stable'))
+
+
+def step(state):
+    """Advance a set of actors by one tick, returning their new state.
+
+    This does the same as `township.actors.Villager.update` does for a
+    single villager, with the same results.
+
+    :param state: The state of the actors, which isn't modified.
+
+    """
+    position = state['position'].copy()
+    target = state['target'].copy()
+    moving = state['moving'].copy()
+
+    position[moving] += state['velocity'][moving]
+    arrived = moving & (vectors.magnitudes_squared(target - position) <=
+                        ARRIVAL_DISTANCE * ARRIVAL_DISTANCE)
+    moving[arrived] = False
+    target[arrived] = position[arrived]
+
+    return dict(state, position=position, target=target, moving=moving)
+
+
+def regions(state, size):
+    """Return the region containing each actor, as an array of (x, y).
+
+    :param state: The state of the actors.
+    :param size: The width and height of a region, in chunks.
+
+    """
+    return numpy.floor_divide(state['position'], size * 16 * 16).astype(
+        numpy.int64)
+
+
+def _owning_workers(region_owners, workers):
+    """Return the index of the worker owning each of an array of regions.
+
+    Regions are grouped into square blocks of `conf.SHARD_BLOCK_SIZE`
+    regions, which are owned by the same worker, so that actors crossing
+    between neighbouring regions mostly stay in the same process.
+
+    :param region_owners: An array of (x, y) regions, as from `regions`.
+    :param workers: The number of workers the regions are split between.
+
+    """
+    blocks = numpy.floor_divide(region_owners, conf.SHARD_BLOCK_SIZE)
+    return (blocks[:, 0] * 31 + blocks[:, 1]) % workers
+
+
+class _Partition(object):
+
+    """The shards owned by a single worker."""
+
+    def __init__(self, region_size, index=0, workers=1):
+        self.region_size = region_size
+        self.index = index
+        self.workers = workers
+        self.shards = {}
+
+    def add(self, state):
+        """Add actors to the shards for their regions."""
+        if not len(state['ids']):
+            return
+        # Group the actors by region, by sorting them by region and
+        # splitting the result where the region changes.
+        owners = regions(state, self.region_size)
+        order = numpy.lexsort((owners[:, 1], owners[:, 0]))
+        owners = owners[order]
+        changes = numpy.flatnonzero((owners[1:] != owners[:-1]).any(axis=1))
+        starts = [0] + (changes + 1).tolist()
+        ends = starts[1:] + [len(order)]
+        for start, end in zip(starts, ends):
+            region = tuple(owners[start].tolist())
+            arrivals = select(state, order[start:end])
+            if region in self.shards:
+                arrivals = merge([self.shards[region], arrivals])
+            else:
+                arrivals = merge([arrivals])
+            self.shards[region] = arrivals
+
+    def step(self, ticks):
+        """Advance every shard, returning the actors another worker owns.
+
+        Actors which move to another region owned by this worker are
+        handed off here, and never leave the worker.
+
+        """
+        shards = self.shards
+        self.shards = {}
+        moved = []
+        for region, state in sorted(shards.items()):
+            for _ in range(0, ticks):
+                state = step(state)
+            homes = regions(state, self.region_size)
+            home = (homes[:, 0] == region[0]) & (homes[:, 1] == region[1])
+            if home.any():
+                self.shards[region] = select(state, home)
+            if not home.all():
+                moved.append(select(state, ~home))
+        moved = merge(moved)
+        mine = _owning_workers(regions(moved, self.region_size),
+                               self.workers) == self.index
+        self.add(select(moved, mine))
+        return select(moved, ~mine)
+
+    def state(self):
+        """Return the state of every actor in these shards."""
+        return merge(self.shards.values())
+
+
+def _serve(connection, region_size, index, workers):
+    # Run in each worker process, keeping its shards between commands
+    partition = _Partition(region_size, index, workers)
+    while True:
+        command, argument = connection.recv()
+        if command == 'add':
+            partition.add(argument)
+        elif command == 'step':
+            connection.send(partition.step(argument))
+        elif command == 'state':
+            connection.send(partition.state())
+        else:
+            break
+    connection.close()
+
+
+class Simulation(object):
+
+    """A set of actors divided into shards by region."""
+
+    def __init__(self, state, workers=None, region_size=None):
+        """Initialise the simulation.
+
+        :param state: The state of the actors to simulate.
+        :param workers: The number of worker processes to step shards in.
+        Defaults to the number of CPUs. If this is 1 no processes are
+        started.
+        :param region_size: The width and height of a shard's region, in
+        chunks. Defaults to `conf.SHARD_REGION_SIZE`.
+
+        """
+        self.region_size = region_size or conf.SHARD_REGION_SIZE
+        self.workers = workers or multiprocessing.cpu_count()
+        self.ticks = 0
+        self._partition = None
+        self._connections = []
+        self._processes = []
+        if self.workers == 1:
+            self._partition = _Partition(self.region_size)
+        else:
+            for index in range(0, self.workers):
+                connection, child = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=_serve,
+                    args=(child, self.region_size, index, self.workers))
+                process.daemon = True
+                process.start()
+                child.close()
+                self._connections.append(connection)
+                self._processes.append(process)
+        self._assign(state)
+
+    def _assign(self, state):
+        if self._partition is not None:
+            self._partition.add(state)
+            return
+        if not len(state['ids']):
+            return
+        worker = _owning_workers(regions(state, self.region_size),
+                                 self.workers)
+        for index, connection in enumerate(self._connections):
+            mine = worker == index
+            if mine.any():
+                connection.send(('add', select(state, mine)))
+
+    def step(self, ticks=1):
+        """Advance every shard, then hand off actors which changed region.
+
+        Each worker keeps the shards it owns between steps, so the only
+        actor state sent between processes is that of actors moving into
+        a region owned by another worker.
+
+        :param ticks: The number of ticks to advance by. Actors are only
+        handed off between shards after the last of them, which is fine
+        while actors don't interact with each other.
+
+        """
+        if self._partition is not None:
+            emigrants = self._partition.step(ticks)
+        else:
+            for connection in self._connections:
+                connection.send(('step', ticks))
+            emigrants = merge([connection.recv()
+                               for connection in self._connections])
+        self._assign(emigrants)
+        self.ticks += ticks
+
+    def state(self):
+        """Return the state of every actor, ordered by actor id."""
+        if self._partition is not None:
+            return self._partition.state()
+        for connection in self._connections:
+            connection.send(('state', None))
+        return merge([connection.recv()
+                      for connection in self._connections])
+
+    def close(self):
+        """Stop the worker processes."""
+        for connection in self._connections:
+            connection.send(('stop', None))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+
+def from_actors(actors):
+    """Return the state of a group of villagers, with ids in group order.
+
+    :param actors: The villagers to get the state of.
+
+    """
+    actors = list(actors)
+    state = empty_state()
+    if not actors:
+        return state
+    state['ids'] = numpy.arange(len(actors), dtype=numpy.int64)
+    state['position'] = numpy.array([actor.position for actor in actors],
+                                    dtype=float)
+    state['target'] = numpy.array([actor.target for actor in actors],
+                                  dtype=float)
+    state['velocity'] = numpy.array([(actor.velocity.x, actor.velocity.y)
+                                     for actor in actors], dtype=float)
+    state['moving'] = numpy.array([actor.state == 'moving'
+                                   for actor in actors], dtype=bool)
+    return state
+
+
+def apply_to_actors(state, actors):
+    """Copy simulated state back into the villagers it was taken from.
+
+    :param state: State from a simulation started with `from_actors`.
+    :param actors: The same villagers, in the same order.
+
+    """
+    actors = list(actors)
+    for i, position, target, moving in zip(state['ids'].tolist(),
+                                           state['position'].tolist(),
+                                           state['target'].tolist(),
+                                           state['moving'].tolist()):
+        actor = actors[i]
+        actor.position = position
+        if moving:
+            actor.state = 'moving'
+            actor.target = target
+        else:
+            actor.state = 'idle'
+            actor.target = actor.position
@@ -22,7 +22,16 @@ from yamlui.parsing import parse_children
 from yamlui.util import create_surface
 from yamlui.widget import Widget
 
-import township
+import township.constructions
+from township import conf
+from township import profiling
+
+
+# The mouse buttons, as numbered in pygame mouse events
+LEFT_BUTTON = 1
+RIGHT_BUTTON = 3
+WHEEL_UP = 4
+WHEEL_DOWN = 5
 
 
 class ViewportSurface(pygame.Surface):
@@ -86,6 +95,47 @@ class GameViewport(Widget):
 
         self.surface = create_surface(self, ViewportSurface)
         self.dx = self.dy = self.xoffset = self.yoffset = 0
+        self.zoom = 0
+        # The latest mouse position from motion events this frame, which
+        # is only used to query the map once per frame in `update`.
+        self.pointer = None
+        # The last known mouse position, from mouse events rather than
+        # asking pygame, so that replayed input behaves the same.
+        self.mouse = None
+
+    def _map_position(self, pos):
+        """Convert a position on the screen into a position on the map.
+
+        :param pos: The (x, y) position on the screen.
+
+        """
+        return (pos[0] * (1 << self.zoom) - self.xoffset,
+                pos[1] * (1 << self.zoom) - self.yoffset)
+
+    def set_zoom(self, zoom, pos):
+        """Change the zoom level, keeping a point on the screen in place.
+
+        :param zoom: The new zoom level, which is clamped to the range
+        of valid levels.
+        :param pos: The (x, y) position on the screen to zoom around.
+
+        """
+        zoom = max(0, min(conf.MAX_ZOOM_LEVEL, zoom))
+        x, y = self._map_position(pos)
+        self.zoom = zoom
+        self.xoffset = pos[0] * (1 << zoom) - x
+        self.yoffset = pos[1] * (1 << zoom) - y
+
+    def apply_pointer(self):
+        """Update the selection or hovered tile from the latest motion."""
+        if self.pointer is None:
+            return
+        position = self._map_position(self.pointer)
+        self.pointer = None
+        if self.game.state == 'selecting':
+            self.game.select_to_tile(*position)
+        elif self.game.state == 'idle':
+            self.game.current_tile = self.game.map.find_tile(*position)
 
     def handle_event(self, event):
         """Handle an event.
@@ -99,6 +149,13 @@ class GameViewport(Widget):
             if handled:
                 return handled
 
+        if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            # Apply any motion from before the click before handling it
+            self.apply_pointer()
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN,
+                          pygame.MOUSEBUTTONUP):
+            self.mouse = event.pos
+
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_RIGHT:
                 self.dx = -4
@@ -123,18 +180,45 @@ class GameViewport(Widget):
                 self.xoffset = 0
                 self.yoffset = 0
                 handled = True
+            elif event.key in (pygame.K_MINUS, pygame.K_EQUALS):
+                centre = self.surface.get_rect().center
+                if event.key == pygame.K_MINUS:
+                    self.set_zoom(self.zoom + 1, centre)
+                else:
+                    self.set_zoom(self.zoom - 1, centre)
+                handled = True
+            elif event.key == pygame.K_F3:
+                profiling.toggle()
+                handled = True
+            elif event.key == pygame.K_F4:
+                profiling.export(conf.PROFILE_EXPORT_PATH)
+                handled = True
+            elif event.key == pygame.K_F5:
+                self.game.save(full=True)
+                handled = True
             elif event.key == pygame.K_s and self.game.selected:
-                stockpile = township.constructions.Stockpile(
-                    self.game.selected)
-                self.game.map.stockpiles.append(stockpile)
-                for tile in self.game.selected:
-                    tile.select()
-                    tile.chunk.dirty = True
-                self.game.selected = []
+                # Selections are rectangles, so checking the bounds of
+                # the selection checks every selected tile.
+                xs = [tile.x for tile in self.game.selected]
+                ys = [tile.y for tile in self.game.selected]
+                if self.game.map.is_clear(min(xs), min(ys),
+                                          max(xs), max(ys)):
+                    stockpile = township.constructions.Stockpile(
+                        self.game.selected)
+                    self.game.map.place(stockpile)
+                    for tile in self.game.selected:
+                        tile.select()
+                        tile.chunk.dirty = True
+                    self.game.selected = []
                 handled = True
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            # TODO(SotK): Make this 1 a constant. It is the left mouse button.
-            if event.button == 1:
+            if event.button == WHEEL_UP:
+                self.set_zoom(self.zoom - 1, event.pos)
+                handled = True
+            elif event.button == WHEEL_DOWN:
+                self.set_zoom(self.zoom + 1, event.pos)
+                handled = True
+            elif event.button == LEFT_BUTTON:
                 # First, check if the click is on an actor like a Villager. If
                 # so then select the actor and skip tile-based selection.
                 self.game.clear_selection()
@@ -145,30 +229,19 @@ class GameViewport(Widget):
                 # selection.
                 if not handled:
                     self.game.state = 'selecting'
-                    position = (event.pos[0] - self.xoffset,
-                                event.pos[1] - self.yoffset)
+                    position = self._map_position(event.pos)
                     self.game.select_tile(*position)
                     handled = True
         elif event.type == pygame.MOUSEMOTION:
-            if self.game.state == 'selecting':
-                position = (event.pos[0] - self.xoffset,
-                            event.pos[1] - self.yoffset)
-                self.game.select_to_tile(*position)
-                handled = True
-            elif self.game.state == 'idle':
-                position = (event.pos[0] - self.xoffset,
-                            event.pos[1] - self.yoffset)
-                self.game.current_tile = (
-                    self.game.map.get_tile(*position))
+            self.pointer = event.pos
+            handled = self.game.state == 'selecting'
         elif event.type == pygame.MOUSEBUTTONUP:
             self.game.state = 'idle'
-            # TODO(SotK): Make this 3 a constant. It is the right mouse button.
-            if event.button == 3:
+            if event.button == RIGHT_BUTTON:
                 if self.game.selected_actors:
                     # If one or more actors are selected, right click is a
                     # command for them to move.
-                    position = (event.pos[0] - self.xoffset,
-                                event.pos[1] - self.yoffset)
+                    position = self._map_position(event.pos)
                     self.game.move_selected(*position)
                 else:
                     self.game.clear_selection()
@@ -179,19 +252,41 @@ class GameViewport(Widget):
 
     def update(self):
         """Update the viewport."""
-        self.xoffset += self.dx
-        self.yoffset += self.dy
-        self.game.map.update(self.surface, self.xoffset, self.yoffset)
+        # Pan at the same speed on screen at every zoom level
+        self.xoffset += self.dx * (1 << self.zoom)
+        self.yoffset += self.dy * (1 << self.zoom)
+        self.apply_pointer()
+        # Render changes near the cursor first
+        focus = None
+        if self.mouse is not None:
+            focus = self._map_position(self.mouse)
+        self.game.map.update(
+            self.surface, self.xoffset, self.yoffset, self.zoom, focus)
 
         # Redraw the game onto the viewport surface
         ui_tree = yamlui.trees.get('maptest.yaml')
         minimap = ui_tree.get('minimap-panel')
         self.game.map.draw(
-            self.surface, self.xoffset, self.yoffset, minimap.surface)
+            self.surface, self.xoffset, self.yoffset, minimap.surface,
+            self.zoom)
 
-        for child in self.children:
+        self.game.autosave()
+
+        for child in self._shown_children():
             child.update()
 
+    def _shown_children(self):
+        """Return the children to update and draw this frame.
+
+        The profiling overlay is only shown while profiling is enabled.
+
+        """
+        if profiling.enabled:
+            return self.children
+        ui_tree = yamlui.trees.get('maptest.yaml')
+        overlay = ui_tree.get('profile-details')
+        return [child for child in self.children if child is not overlay]
+
     def draw(self, surface):
         """Draw the viewport onto the given surface.
 
@@ -200,5 +295,5 @@ class GameViewport(Widget):
         """
         self.surface.draw(surface)
 
-        for child in self.children:
+        for child in self._shown_children():
             child.draw(surface)
@@ -16,10 +16,60 @@
 """A controller to manage game state."""
 
 
+import atexit
+import functools
+import time
+import weakref
+
 import pygame
 import yamlui
 
-import township
+import township.images
+import township.map
+from township import conf
+from township import profiling
+from township.chunkstore import ChunkStore
+from township.savegame import SaveGame
+from township.util import vectors
+
+
+# The distance from the centre of an actor, in pixels, within which
+# clicking picks it. Villagers are drawn as circles 16 pixels across.
+PICK_RADIUS = 8
+
+
+def cached_label(key):
+    """Only rebuild the text of a label callback when its subject changes.
+
+    Labels poll their callbacks every frame. The decorated callback is
+    only called when `key` returns something different to last time,
+    otherwise the same string as last time is returned, so the label
+    has no new text to render.
+
+    :param key: A function of the controller which returns a value that
+    changes whenever the label's text would, such as the object the
+    label describes and its version.
+
+    """
+    def decorator(func):
+        cache = weakref.WeakKeyDictionary()
+
+        @functools.wraps(func)
+        def wrapper(self, event=None, widget=None, **kwargs):
+            state = key(self)
+            cached = cache.get(self)
+            if cached is None or cached[0] != state:
+                cached = (state, func(self, event, widget, **kwargs))
+                cache[self] = cached
+            return cached[1]
+        return wrapper
+    return decorator
+
+
+def _versioned(item):
+    if item is None:
+        return None
+    return (item, item.version)
 
 
 @yamlui.callback('game_controller')
@@ -33,14 +83,27 @@ class GameController(object):
     """
 
     def __init__(self, event, widget):
-        # Pre-load resources
+        # Find resources, they are decoded when first used
         township.images.load_terrain()
         township.images.load_map_resources()
 
         # TODO(SotK): Map generation shouldn't happen here
         # Should be loading a map that was pre-generated in
-        # the menu screen.
-        self.map = township.map.Map(123123456574)
+        # the menu screen. Chunks are generated as they're needed,
+        # starting with the visible ones in the first frame.
+        self.savegame = None
+        if conf.SAVE_PATH is not None:
+            self.savegame = SaveGame(conf.SAVE_PATH)
+        if self.savegame is not None and self.savegame.exists():
+            self.map = self.savegame.load()
+        else:
+            self.map = township.map.Map(conf.SEED, generate=False)
+        if conf.CHUNK_STORE is not None:
+            self.map.store = ChunkStore(conf.CHUNK_STORE, self.map.seed)
+        self.last_save = time.time()
+        # Snapshots are written in the background, so make sure the last
+        # one is written when the game exits.
+        atexit.register(self.shutdown)
 
         self.state = 'idle'
         self.selected = []
@@ -126,8 +189,12 @@ class GameController(object):
 
     def select_actor(self, x, y):
         handled = False
-        for actor in self.map.actors:
-            if actor.rect.collidepoint(x, y):
+        # Only actors near the view have their rect kept up to date
+        actors = list(self.map.actor_scheduler.visible)
+        centres = [actor.rect.center for actor in actors]
+        hits = vectors.within(centres, (x, y), PICK_RADIUS).tolist()
+        for actor, hit in zip(actors, hits):
+            if hit:
                 actor.select()
                 if actor in self.selected_actors:
                     self.selected_actors.remove(actor)
@@ -137,9 +204,36 @@ class GameController(object):
         return handled
 
     def move_selected(self, x, y):
+        self.map.actor_scheduler.synchronise()
         for actor in self.selected_actors:
             actor.move_to(x, y)
 
+    def save(self, full=False):
+        """Take a snapshot of the game, which is written in the background.
+
+        :param full: Whether to check every loaded chunk for changes,
+        rather than just the ones which have been re-rendered.
+
+        """
+        if self.savegame is None:
+            return
+        with profiling.span('save'):
+            self.savegame.snapshot(self.map, full=full)
+        self.last_save = time.time()
+
+    def shutdown(self):
+        """Save everything and wait for it to be written, before exiting."""
+        if self.savegame is None:
+            return
+        self.save(full=True)
+        self.savegame.close()
+
+    def autosave(self):
+        """Save the game if it hasn't been saved for long enough."""
+        if time.time() - self.last_save >= conf.AUTOSAVE_INTERVAL:
+            self.save()
+
+    @cached_label(lambda self: _versioned(self.current_tile))
     def get_current_tile_info(self, event=None, widget=None, **kwargs):
         if self.current_tile is None:
             return ''
@@ -154,12 +248,33 @@ class GameController(object):
             self.current_tile.get_resource())
         return tile_info
 
+    @cached_label(lambda self: _versioned(
+        self.selected_items[0] if self.selected_items else None))
     def get_selection_info(self, event=None, widget=None, **kwargs):
         if self.selected_items:
             return str(self.selected_items[0])
         return ''
 
+    @cached_label(lambda self: _versioned(
+        self.selected_actors.sprites()[0] if self.selected_actors else None))
     def get_selected_actor_info(self, event=None, widget=None, **kwargs):
         if self.selected_actors:
             return str(self.selected_actors.sprites()[0])
         return ''
+
+    def get_profile_info(self, event=None, widget=None, **kwargs):
+        if not profiling.enabled:
+            return ''
+        summary = profiling.summary()
+        lines = ['Frame: %.2fms' % (summary['time'] * 1000)]
+        for name, elapsed in sorted(summary['spans'].items()):
+            lines.append('    %s: %.2fms' % (name, elapsed * 1000))
+        for name, value in sorted(summary['counters'].items()):
+            lines.append('    %s: %d' % (name, value))
+        report = self.map.memory.report()
+        lines.append('Memory: %.1fMB (peak %.1fMB)' % (
+            report['total'] / 1048576.0, report['peak_total'] / 1048576.0))
+        for name, value in sorted(report['current'].items()):
+            lines.append('    %s: %.1fMB (peak %.1fMB)' % (
+                name, value / 1048576.0, report['peak'][name] / 1048576.0))
+        return '\n'.join(lines)
@@ -1 +1,2 @@
+from . import seeding
 from . import vectors
@@ -0,0 +1,49 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Utilities for deriving reproducible random number generators."""
+
+
+import hashlib
+import random
+
+
+def derive_seed(seed, *coords):
+    """Derive an integer seed from a base seed and some coordinates.
+
+    The result only depends on the given values, so it is the same across
+    processes and Python invocations, unlike the builtin ``hash``.
+
+    :param seed: The base seed.
+    :param coords: Integer coordinates to mix into the seed.
+
+    """
+    key = ':'.join([repr(seed)] + [str(int(c)) for c in coords])
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16)
+
+
+def chunk_random(seed, x, y):
+    """Return a random number generator for the chunk at (x, y).
+
+    Every chunk gets its own stream of random numbers, so the content of
+    a chunk doesn't depend on which other chunks were generated before it.
+
+    :param seed: The base seed, usually the seed of a noise generator.
+    :param x: The x position of the chunk.
+    :param y: The y position of the chunk.
+
+    """
+    return random.Random(derive_seed(seed, x, y))
@@ -13,15 +13,35 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Utilities for working with two-dimensional vectors."""
+"""Utilities for working with two-dimensional vectors.
+
+`Vector2` is for working with single vectors. It supports operators, and
+in-place versions of the common operations so that code which runs every
+tick doesn't need to allocate new vectors. The functions in this module
+work on NumPy arrays of vectors or points with a shape of (n, 2).
+
+"""
 
 
 import math
 
+import numpy
+
 
 class Vector2(object):
 
-    """A two-dimensional vector."""
+    """A two-dimensional vector.
+
+    Vectors are compared by value, but are changed in place by the in-place
+    operators and `set`, so they are unhashable. Use `(v.x, v.y)` as a key
+    in sets and dicts instead.
+
+    """
+
+    __slots__ = ('x', 'y')
+
+    # Mutable and compared by value, so hashing would break dict lookups
+    __hash__ = None
 
     def __init__(self, x, y):
         self.x = x
@@ -30,10 +50,69 @@ class Vector2(object):
     def __str__(self):
         return 'Vector2(%f, %f)' % (self.x, self.y)
 
+    def __repr__(self):
+        return str(self)
+
+    def __eq__(self, other):
+        if not (hasattr(other, 'x') and hasattr(other, 'y')):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __add__(self, other):
+        return Vector2(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other):
+        return Vector2(self.x - other.x, self.y - other.y)
+
+    def __mul__(self, scalar):
+        return Vector2(self.x * scalar, self.y * scalar)
+
+    __rmul__ = __mul__
+
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __imul__(self, scalar):
+        self.x *= scalar
+        self.y *= scalar
+        return self
+
+    def set(self, x, y):
+        """Set both components of the vector, returning the vector."""
+        self.x = x
+        self.y = y
+        return self
+
+    def set_from_points(self, start, end):
+        """Set the vector to the one from `start` to `end`, in place.
+
+        :param start: The (x, y) point the vector starts at.
+        :param end: The (x, y) point the vector ends at.
+
+        """
+        self.x = end[0] - start[0]
+        self.y = end[1] - start[1]
+        return self
+
     @property
     def magnitude(self):
         return math.sqrt(self.y**2 + self.x**2)
 
+    @property
+    def magnitude_squared(self):
+        """The squared magnitude, for comparing without a square root."""
+        return self.y * self.y + self.x * self.x
+
     @property
     def normalised(self):
         mag = self.magnitude
@@ -41,6 +120,60 @@ class Vector2(object):
             raise ValueError("Can't normalise a vector with magnitude 0")
         return Vector2(self.x / mag, self.y / mag)
 
+    def normalise(self):
+        """Normalise the vector in place, returning the vector."""
+        mag = self.magnitude
+        if mag == 0:
+            raise ValueError("Can't normalise a vector with magnitude 0")
+        self.x /= mag
+        self.y /= mag
+        return self
+
     @classmethod
     def from_points(cls, start, end):
         return cls(end[0] - start[0], end[1] - start[1])
+
+
+def magnitudes_squared(vectors):
+    """Return the squared magnitude of each of an array of vectors."""
+    vectors = numpy.asarray(vectors, dtype=float)
+    return vectors[:, 1] * vectors[:, 1] + vectors[:, 0] * vectors[:, 0]
+
+
+def magnitudes(vectors):
+    """Return the magnitude of each of an array of vectors."""
+    return numpy.sqrt(magnitudes_squared(vectors))
+
+
+def normalised(vectors):
+    """Return an array of vectors scaled to have a magnitude of 1.
+
+    Vectors with a magnitude of 0 are left as they are.
+
+    """
+    vectors = numpy.asarray(vectors, dtype=float)
+    mags = magnitudes(vectors)
+    mags[mags == 0] = 1
+    return vectors / mags[:, numpy.newaxis]
+
+
+def distances_squared(points, point):
+    """Return the squared distance from each of an array of points to a point.
+
+    :param points: An array of (x, y) points.
+    :param point: The (x, y) point to measure the distances to.
+
+    """
+    points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+    return magnitudes_squared(points - numpy.asarray(point, dtype=float))
+
+
+def within(points, point, radius):
+    """Return a boolean array of which points are within a radius of a point.
+
+    :param points: An array of (x, y) points.
+    :param point: The (x, y) point at the centre of the circle.
+    :param radius: The radius of the circle.
+
+    """
+    return distances_squared(points, point) <= radius * radius
@@ -0,0 +1,91 @@
+# Copyright (c) 2018 Adam Coldrick
+#
+# This program is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Generation of chunks ahead of time, across multiple processes."""
+
+
+import multiprocessing
+
+from township import chunkstore
+from township.map import generate_chunk_data, make_generators
+
+
+# The noise generators of a worker process, created once per worker by
+# `_init_worker` since creating them is comparatively expensive.
+_generators = None
+
+
+def _init_worker(seed):
+    global _generators
+    _generators = make_generators(seed)
+
+
+def _generate(position):
+    x, y = position
+    data = generate_chunk_data(x, y, *_generators)
+    return x, y, chunkstore.pack_chunk(x, y, data)
+
+
+def chunk_positions(x0, y0, x1, y1):
+    """Return the chunk positions in a rectangle, row by row.
+
+    The rectangle includes (x0, y0) but excludes (x1, y1).
+
+    """
+    return [(x, y) for y in range(y0, y1) for x in range(x0, x1)]
+
+
+def pregenerate(seed, rect, store, workers=None, skip_existing=True,
+                progress=None):
+    """Generate all the chunks in a rectangle and write them to a store.
+
+    The output only depends on the seed and the rectangle, so the number
+    of worker processes makes no difference to what ends up in the store.
+
+    :param seed: The seed of the world to generate.
+    :param rect: The (x0, y0, x1, y1) rectangle of chunks to generate.
+    :param store: The ChunkStore to write the chunks to.
+    :param workers: The number of worker processes to use. Defaults to
+    the number of CPUs. If this is 1 no processes are started.
+    :param skip_existing: Whether to skip chunks that are already in the
+    store.
+    :param progress: A callable called with (done, total) after each
+    chunk is written.
+
+    """
+    positions = chunk_positions(*rect)
+    if skip_existing:
+        positions = [pos for pos in positions if pos not in store]
+    total = len(positions)
+
+    if workers == 1:
+        _init_worker(seed)
+        results = (_generate(pos) for pos in positions)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, _init_worker, (seed,))
+        results = pool.imap_unordered(_generate, positions, chunksize=16)
+
+    try:
+        for done, (x, y, payload) in enumerate(results, 1):
+            store.write(x, y, payload)
+            if progress is not None:
+                progress(done, total)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return total